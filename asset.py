@@ -1,13 +1,28 @@
 
+import logging
 import os
+import threading
+from bisect import bisect_left
 import flet as ft
-import sqlite3
 from assetpage import AssetFormPage
-from assetedit import AssetEditPage
-from sync_server import initialize_local_db, sync_from_server, sync_to_server
+from perf import ui_trace
+from repository import SORT_OPTIONS, get_repository
+from sync_worker import run_sync_dialog
+from ui_updates import add_overlays, batch_updates, get_update_scheduler, remove_overlays
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per keyset page and how close to the end of the list (in pixels) the next page is loaded
+PAGE_SIZE = 50
+LOAD_AHEAD_PIXELS = 300
+ROW_HEIGHT = 44
+# Seconds of typing pause before the search box queries the index
+SEARCH_DEBOUNCE = 0.3
+
+STATUS_FILTERS = ["All", "Available", "Deployed", "Disposed/Sold"]
 
 class AssetPage(ft.Container):
-    def __init__(self, page: ft.Page):
+    def __init__(self, page: ft.Page, show_search=False):
         super().__init__()
 
         self.page = page
@@ -20,10 +35,10 @@ class AssetPage(ft.Container):
         self.page.theme_mode = ft.ThemeMode.LIGHT
         self.page.bgcolor = ft.Colors.WHITE
 
-        self.local_db = sqlite3.connect("assets.db", check_same_thread=False)
-        initialize_local_db(self.local_db)
+        self.repository = get_repository()
+        self.updates = get_update_scheduler(page)
         
-        self.add_asset_dialog = AssetFormPage(self.page, self, local_db=self.local_db)
+        self.add_asset_dialog = AssetFormPage(self.page, self, repository=self.repository)
         
         self.page.appbar = ft.AppBar(
             title=ft.Text("Asset Management", size=15, weight="bold"),
@@ -48,7 +63,7 @@ class AssetPage(ft.Container):
                         icon=ft.Icon(ft.Icons.MENU_BOOK, color=ft.Colors.WHITE),
                         tooltip="Menu Options",
                     ),
-                    ft.IconButton(icon=ft.Icons.SEARCH, icon_color=ft.Colors.WHITE, tooltip="Search"),
+                    ft.IconButton(icon=ft.Icons.SEARCH, icon_color=ft.Colors.WHITE, tooltip="Search", on_click=self.toggle_search),
                     ft.Container(expand=True),
                     ft.IconButton(icon=ft.Icons.FAVORITE, icon_color=ft.Colors.WHITE, tooltip="Favorites"),
                 ],
@@ -88,18 +103,59 @@ class AssetPage(ft.Container):
             height=40,
         )
 
-        # Initialize local asset table with selected columns
-        self.local_asset_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Model", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800)),
-                ft.DataColumn(ft.Text("Serial Number", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800)),
-                ft.DataColumn(ft.Text("Location", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800)),
-                ft.DataColumn(ft.Text("Edit", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800)),
-            ],
-            rows=[],
-            border=ft.border.all(1, ft.Colors.BLUE_GREY_300),
-            vertical_lines=ft.border.BorderSide(1, ft.Colors.BLUE_GREY_300),
-            column_spacing=5,
+        # Asset list: rows are fetched a keyset page at a time and built only as the user scrolls
+        self.sort_by = "Date Added"
+        self.status_filter = "All"
+        self.last_key = None
+        self.all_loaded = False
+        # Keys of the loaded rows in list order, and asset id -> key, so single rows can be patched in place
+        self.row_keys = []
+        self.row_index = {}
+        # Asset id -> get_edit_details() row of the loaded rows, so the editor opens without a query
+        self.edit_details = {}
+        self.search_text = ""
+        self.search_timer = None
+        # repository.data_version() when the list was last loaded or patched, to spot changes made while away
+        self.loaded_version = None
+        # Guards the list state above: handlers run on Flet's thread pool, the search on a Timer
+        # thread and the refresh after a pull on the sync thread
+        self.list_lock = threading.RLock()
+        self.search_field = ft.TextField(
+            hint_text="Search model, serial, company, location", prefix_icon=ft.Icons.SEARCH,
+            dense=True, text_size=12, visible=show_search, autofocus=show_search,
+            on_change=self.on_search_change,
+        )
+        self.sort_dropdown = ft.Dropdown(
+            label="Sort by", value=self.sort_by, dense=True, width=160, text_size=12,
+            options=[ft.dropdown.Option(option) for option in SORT_OPTIONS],
+            on_change=self.change_sort,
+        )
+        self.status_dropdown = ft.Dropdown(
+            label="Status", value=self.status_filter, dense=True, width=160, text_size=12,
+            options=[ft.dropdown.Option(option) for option in STATUS_FILTERS],
+            on_change=self.change_status_filter,
+        )
+        self.asset_list_header = ft.Container(
+            content=ft.Row(
+                controls=[
+                    ft.Text("Model", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800, expand=3),
+                    ft.Text("Serial Number", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800, expand=3),
+                    ft.Text("Location", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800, expand=3),
+                    ft.Text("Edit", weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800, expand=2),
+                ],
+                spacing=5,
+            ),
+            padding=ft.padding.symmetric(horizontal=5, vertical=8),
+            bgcolor=ft.Colors.WHITE,
+            border=ft.border.only(bottom=ft.border.BorderSide(1, ft.Colors.BLUE_GREY_300)),
+        )
+        self.asset_list = ft.ListView(
+            controls=[],
+            expand=True,
+            spacing=0,
+            item_extent=ROW_HEIGHT,
+            on_scroll=self.on_asset_list_scroll,
+            on_scroll_interval=100,
         )
 
         self.sync_from_server_button = ft.ElevatedButton(
@@ -130,7 +186,8 @@ class AssetPage(ft.Container):
             actions=[ft.TextButton("OK", on_click=self.close_sync_dialog)],
             actions_alignment=ft.MainAxisAlignment.END
         )
-        self.page.overlay.append(self.sync_dialog)
+        self.overlays = add_overlays(self.page, self.sync_dialog)
+        self.edit_dialog = None
 
         self.content = ft.Container(
             content=ft.Column(
@@ -141,8 +198,13 @@ class AssetPage(ft.Container):
                         spacing=10,
                     ),
                     ft.Text("Local Assets", size=18, weight=ft.FontWeight.BOLD),
+                    self.search_field,
+                    ft.Row(
+                        controls=[self.sort_dropdown, self.status_dropdown],
+                        spacing=10,
+                    ),
                     ft.Container(
-                        content=self.local_asset_table,
+                        content=ft.Column(controls=[self.asset_list_header, self.asset_list], spacing=0, expand=True),
                         expand=True,
                         width=self.page.window.width - 20,
                         clip_behavior=ft.ClipBehavior.HARD_EDGE,
@@ -159,100 +221,228 @@ class AssetPage(ft.Container):
                 ],
                 expand=True,
                 spacing=10,
-                scroll=ft.ScrollMode.AUTO,
             ),
             padding=10,
         )
 
-        # Load initial local assets
+        # Load initial local assets; main places the view on the page
         self.refresh_local_assets()
-        self.page.add(self)
-        self.page.update()
 
-    def refresh_local_assets(self):
-        cursor = self.local_db.cursor()
-        try:
-            cursor.execute("SELECT id, model, serial_number, company, location, purchase_date, status, last_sync FROM assets")
-            assets = cursor.fetchall()
-            print(f"SQLite3 query returned {len(assets)} assets: {[row[2] for row in assets]}")
-
-            self.local_asset_table.rows.clear()
-
-            if not assets:
-                self.local_asset_table.rows.append(
-                    ft.DataRow(
-                        cells=[
-                            ft.DataCell(ft.Text("No local assets found in SQLite3.")),
-                            ft.DataCell(ft.Text("")),
-                            ft.DataCell(ft.Text("")),
-                            ft.DataCell(ft.Text("")),
-                        ]
-                    )
-                )
+    def show(self, show_search=False):
+        """Called on every visit to the cached view: sets up the search box and reloads the list only if the data changed."""
+        if self.search_field.visible != show_search:
+            self.search_field.visible = self.search_field.autofocus = show_search
+            if not show_search:
+                self.search_field.value = ""
+        search_text = (self.search_field.value or "").strip()
+        if search_text != self.search_text or self.repository.data_version() != self.loaded_version:
+            self.search_text = search_text
+            self.refresh_local_assets()
+
+    def dispose(self):
+        """Stop the pending search and take this view's dialogs, and those it opened, off the page overlay."""
+        if self.search_timer:
+            self.search_timer.cancel()
+        self.add_asset_dialog.dispose()
+        if self.edit_dialog:
+            self.edit_dialog.dispose()
+        remove_overlays(self.page, self.overlays)
+
+    def fetch_asset_page(self, after=None):
+        """Fetch the next PAGE_SIZE assets after the (sort value, id) keyset position."""
+        return self.repository.list_assets(self.sort_by, self.status_filter, after, PAGE_SIZE)
+
+    def fetch_asset(self, asset_id):
+        """Fetch one asset as a list row, or None if it is gone or hidden by the current filter."""
+        return self.repository.get_list_row(asset_id, self.sort_by, self.status_filter)
+
+    def build_asset_row(self, asset_id, model, serial_number, location):
+        edit_button = ft.IconButton(
+            icon=ft.Icons.EDIT,
+            icon_color=ft.Colors.BLUE,
+            bgcolor=ft.LinearGradient(
+                begin=ft.alignment.top_left,
+                end=ft.alignment.bottom_right,
+                colors=[ft.Colors.BLUE_500, ft.Colors.BLUE_700]
+            ),
+            style=ft.ButtonStyle(
+                shape=ft.RoundedRectangleBorder(radius=8),
+                overlay_color=ft.Colors.BLUE_400
+            ),
+            tooltip="Edit Asset",
+            on_click=lambda e, aid=asset_id: self.open_edit_dialog(aid)
+        )
+        return ft.Container(
+            content=ft.Row(
+                controls=[
+                    ft.Text(model or "N/A", color=ft.Colors.BLUE_GREY_800, size=12, expand=3, no_wrap=True),
+                    ft.Text(serial_number or "N/A", color=ft.Colors.BLUE_GREY_800, size=12, expand=3, no_wrap=True),
+                    ft.Text(location or "N/A", color=ft.Colors.BLUE_GREY_800, size=12, expand=3, no_wrap=True),
+                    ft.Container(content=edit_button, alignment=ft.alignment.center, expand=2),
+                ],
+                spacing=5,
+            ),
+            height=ROW_HEIGHT,
+            padding=ft.padding.symmetric(horizontal=5),
+            bgcolor=ft.Colors.WHITE,
+            # A divider instead of alternating colours keeps inserting a row from restyling the rows below it
+            border=ft.border.only(bottom=ft.border.BorderSide(1, ft.Colors.BLUE_GREY_50)),
+        )
+
+    def build_message_row(self, message):
+        return ft.Container(content=ft.Text(message), height=ROW_HEIGHT, padding=ft.padding.symmetric(horizontal=5))
+
+    def load_next_page(self):
+        with self.list_lock:
+            if self.all_loaded:
+                return False
+            if self.search_text:
+                # A search lists only its best PAGE_SIZE hits, ranked by relevance
+                assets = self.repository.search_assets(self.search_text, self.status_filter, PAGE_SIZE)
+                self.all_loaded = True
             else:
-                for i, asset in enumerate(assets):
-                    asset_id, model, serial_number, company, location, purchase_date, status, last_sync = asset
-                    edit_button = ft.IconButton(
-                        icon=ft.Icons.EDIT,
-                        icon_color=ft.Colors.BLUE,
-                        bgcolor=ft.LinearGradient(
-                            begin=ft.alignment.top_left,
-                            end=ft.alignment.bottom_right,
-                            colors=[ft.Colors.BLUE_500, ft.Colors.BLUE_700]
-                        ),
-                        style=ft.ButtonStyle(
-                            shape=ft.RoundedRectangleBorder(radius=8),
-                            overlay_color=ft.Colors.BLUE_400
-                        ),
-                        tooltip="Edit Asset",
-                        on_click=lambda e, aid=asset_id: self.open_edit_dialog(aid)
-                    )
-                    self.local_asset_table.rows.append(
-                        ft.DataRow(
-                            cells=[
-                                ft.DataCell(ft.Text(model or "N/A", color=ft.Colors.BLUE_GREY_800, size=12)),
-                                ft.DataCell(ft.Text(serial_number or "N/A", color=ft.Colors.BLUE_GREY_800, size=12)),
-                                ft.DataCell(ft.Text(location or "N/A", color=ft.Colors.BLUE_GREY_800, size=12)),
-                                ft.DataCell(ft.Container(content=edit_button, alignment=ft.alignment.center)),
-                            ],
-                            color=ft.Colors.WHITE if i % 2 == 0 else ft.Colors.BLUE_GREY_50
-                        )
-                    )
-
-            self.page.update()
-            print(f"Refreshed asset table with {len(self.local_asset_table.rows)} rows")
-        except Exception as e:
-            print(f"Error fetching local asset data from SQLite3: {e}")
-            self.local_asset_table.rows.clear()
-            self.local_asset_table.rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(f"Error: {e}")),
-                        ft.DataCell(ft.Text("")),
-                        ft.DataCell(ft.Text("")),
-                        ft.DataCell(ft.Text("")),
-                    ]
-                )
-            )
-            self.page.update()
-        finally:
-            cursor.close()
+                assets = self.fetch_asset_page(self.last_key)
+                self.all_loaded = len(assets) < PAGE_SIZE
+            # The list row has everything the editor shows except the image, fetched for the whole page at once
+            image_digests = self.repository.get_image_digests([asset[0] for asset in assets])
+            for asset_id, model, serial_number, location, sort_value in assets:
+                self.asset_list.controls.append(self.build_asset_row(asset_id, model, serial_number, location))
+                self.row_keys.append((sort_value, asset_id))
+                self.row_index[asset_id] = (sort_value, asset_id)
+                self.edit_details[asset_id] = (model, serial_number, location, image_digests.get(asset_id))
+            if assets:
+                self.last_key = (assets[-1][4], assets[-1][0])
+            return bool(assets)
+
+    def refresh_local_assets(self):
+        with ui_trace.phase("asset list refresh"):
+            self.reload_asset_list()
+            self.updates.request()
+
+    def reload_asset_list(self):
+        with self.list_lock:
+            self.loaded_version = self.repository.data_version()
+            self.asset_list.controls.clear()
+            self.last_key = None
+            self.all_loaded = False
+            self.row_keys = []
+            self.row_index = {}
+            self.edit_details = {}
+            try:
+                self.load_next_page()
+                if not self.asset_list.controls:
+                    message = "No assets match your search." if self.search_text else "No local assets found in SQLite3."
+                    self.asset_list.controls.append(self.build_message_row(message))
+            except Exception as e:
+                logger.error("Error fetching local asset data from SQLite3: %s", e)
+                self.asset_list.controls.clear()
+                self.all_loaded = True
+                self.asset_list.controls.append(self.build_message_row(f"Error: {e}"))
+
+    def apply_asset_change(self, asset_id):
+        """Insert, update or remove only the list row of asset_id; the caller sends the page update."""
+        with self.list_lock:
+            self.loaded_version = self.repository.data_version()
+            self.edit_details.pop(asset_id, None)
+            if self.search_text:
+                # Search hits are ordered by rank, so re-run the (single page) search instead
+                self.reload_asset_list()
+                return
+            try:
+                asset = self.fetch_asset(asset_id)
+            except Exception as e:
+                logger.error("Error fetching asset %s from SQLite3: %s", asset_id, e)
+                return
+            old_key = self.row_index.pop(asset_id, None)
+            if old_key is not None:
+                position = bisect_left(self.row_keys, old_key)
+                del self.row_keys[position]
+                del self.asset_list.controls[position]
+            if asset is None:
+                return
+
+            _, model, serial_number, location, sort_value = asset
+            key = (sort_value, asset_id)
+            position = bisect_left(self.row_keys, key)
+            if position == len(self.row_keys) and not self.all_loaded:
+                # Past the loaded window; it will arrive with the next keyset page
+                return
+            if not self.row_keys:
+                # Drop the "no assets" placeholder row
+                self.asset_list.controls.clear()
+            self.row_keys.insert(position, key)
+            self.row_index[asset_id] = key
+            self.asset_list.controls.insert(position, self.build_asset_row(asset_id, model, serial_number, location))
 
+    @batch_updates
+    def on_asset_list_scroll(self, e: ft.OnScrollEvent):
+        if self.all_loaded or e.pixels < e.max_scroll_extent - LOAD_AHEAD_PIXELS:
+            return
+        with self.list_lock:
+            try:
+                if self.load_next_page():
+                    self.updates.request(self.asset_list)
+            except Exception as ex:
+                logger.error("Error fetching more assets from SQLite3: %s", ex)
+                self.all_loaded = True
+
+    @batch_updates
+    def toggle_search(self, e):
+        self.search_field.visible = not self.search_field.visible
+        if not self.search_field.visible and self.search_field.value:
+            self.search_field.value = ""
+            self.run_search()
+        else:
+            self.updates.request()
+
+    def on_search_change(self, e):
+        # Restart the countdown on every keystroke so only the pause after typing queries the index
+        if self.search_timer:
+            self.search_timer.cancel()
+        self.search_timer = threading.Timer(SEARCH_DEBOUNCE, self.run_search)
+        self.search_timer.daemon = True
+        self.search_timer.start()
+
+    @batch_updates
+    def run_search(self):
+        search_text = (self.search_field.value or "").strip()
+        if search_text == self.search_text:
+            self.updates.request()
+            return
+        self.search_text = search_text
+        self.refresh_local_assets()
+
+    @batch_updates
+    def change_sort(self, e):
+        self.sort_by = self.sort_dropdown.value or "Date Added"
+        self.refresh_local_assets()
+
+    @batch_updates
+    def change_status_filter(self, e):
+        self.status_filter = self.status_dropdown.value or "All"
+        self.refresh_local_assets()
+
+    @batch_updates
     def sync_from_server(self, e=None):
-        sync_from_server(self.local_db, self.page)
-        self.sync_dialog.content = ft.Text("Sync from server completed!")
-        self.sync_dialog.open = True
-        self.page.update()
+        run_sync_dialog(
+            self.page, self.sync_dialog, "pull", self.close_sync_dialog,
+            on_finished=self.refresh_after_pull,
+        )
+
+    def refresh_after_pull(self, result):
+        # A cancelled or failed pull keeps the batches it committed, so compare the data, not result.ok;
+        # a stale list would also hand the editor stale prefetched details
+        if self.repository.data_version() != self.loaded_version:
+            self.refresh_local_assets()
 
+    @batch_updates
     def sync_to_server(self, e=None):
-        sync_to_server(self.local_db, self.page)
-        self.sync_dialog.content = ft.Text("Sync to server completed!")
-        self.sync_dialog.open = True
-        self.page.update()
+        run_sync_dialog(self.page, self.sync_dialog, "push", self.close_sync_dialog)
 
+    @batch_updates
     def close_sync_dialog(self, e):
         self.sync_dialog.open = False
-        self.page.update()
+        self.updates.request()
 
     def load_assets(self):
         pass
@@ -260,6 +450,10 @@ class AssetPage(ft.Container):
     def update_table(self):
         pass
 
+    @batch_updates
     def open_edit_dialog(self, asset_id):
-        self.edit_dialog = AssetEditPage(self.page, self, asset_id=asset_id, local_db=self.local_db)
-        self.edit_dialog.open_dialog()
+        # One editor, imported and built on first use, is rebound to every asset opened
+        if self.edit_dialog is None:
+            from assetedit import AssetEditPage
+            self.edit_dialog = AssetEditPage(self.page, self, repository=self.repository)
+        self.edit_dialog.open_dialog(asset_id, self.edit_details.get(asset_id))
@@ -1,22 +1,27 @@
+import logging
 import os
 import flet as ft
-import sqlite3
-import base64
-import time
-from sync_server import initialize_local_db
+from repository import get_repository
+from sync_server import store_attachment
+from thumbnails import clear_thumbnail, show_thumbnail
+from ui_updates import add_overlays, batch_updates, get_update_scheduler, remove_overlays
+
+logger = logging.getLogger(__name__)
 
 class AssetEditPage:
-    def __init__(self, page: ft.Page, parent=None, asset_id=None, local_db=None):
+    """The asset edit dialog. AssetPage keeps one and rebinds it to each asset it opens."""
+
+    def __init__(self, page: ft.Page, parent=None, asset_id=None, repository=None):
         if page is None:
             raise ValueError("Page object must be provided to AssetEditPage")
         self.page = page
         self.parent = parent
         self.asset_id = asset_id
-        self.local_db = local_db or sqlite3.connect("assets.db", check_same_thread=False)
-        initialize_local_db(self.local_db)
+        self.repository = repository or get_repository()
+        self.updates = get_update_scheduler(page)
         self.TEMP_DIR = os.path.join(os.getcwd(), "temp")
         os.makedirs(self.TEMP_DIR, exist_ok=True)
-        print(f"Initialized TEMP_DIR: {self.TEMP_DIR}, writable: {os.access(self.TEMP_DIR, os.W_OK)}")
+        logger.debug("Initialized TEMP_DIR: %s", self.TEMP_DIR)
 
         self.error_popup = ft.AlertDialog(title=ft.Text("Error"), content=ft.Text(""), actions=[ft.TextButton("OK", on_click=self.close_error_popup)])
         self.success_popup = ft.AlertDialog(title=ft.Text("Success"), content=ft.Text(""), actions=[ft.TextButton("OK", on_click=self.close_success_popup)])
@@ -36,6 +41,8 @@ class AssetEditPage:
         # Initialize attached_images and attached_bills as empty lists
         self.attached_images = []
         self.attached_bills = []
+        self.attached_image_bytes = None
+        self.attached_bill_bytes = None
 
         self.dialog = ft.AlertDialog(
             modal=True, bgcolor=ft.Colors.YELLOW_100, title=ft.Text("Edit Asset"),
@@ -47,46 +54,62 @@ class AssetEditPage:
             actions=[ft.TextButton("Cancel", on_click=self.close_dialog), ft.TextButton("Save", on_click=self.save_asset)],
             actions_alignment=ft.MainAxisAlignment.END)
 
-        self.page.overlay.extend([self.error_popup, self.success_popup, self.asset_image, self.asset_bill, self.dialog])
+        self.overlays = add_overlays(self.page, self.error_popup, self.success_popup, self.asset_image, self.asset_bill, self.dialog)
 
         if self.asset_id:
             self.load_asset_data()
 
-    def open_dialog(self):
+    def dispose(self):
+        """Take this editor's dialogs and pickers off the page overlay."""
+        remove_overlays(self.page, self.overlays)
+
+    def bind(self, asset_id, details=None):
+        """Point the dialog at another asset, dropping what was picked for the previous one.
+
+        details is the asset's get_edit_details() row when the caller already has it.
+        """
+        self.asset_id = asset_id
+        self.reset_attachments()
+        self.load_asset_data(details)
+
+    @batch_updates
+    def open_dialog(self, asset_id=None, details=None):
+        if asset_id is not None:
+            self.bind(asset_id, details)
         if self.asset_id:
-            self.load_asset_data()
             self.dialog.open = True
-            self.page.update()
+            self.updates.request()
 
-    def load_asset_data(self):
-        """Fetch and display asset details from the local database."""
+    def load_asset_data(self, details=None):
+        """Display asset details from details, or from one query of the local database."""
         if not self.asset_id:
             self.error_popup.content = ft.Text("No asset ID provided for editing.")
             self.error_popup.open = True
             return
-        cursor = self.local_db.cursor()
         try:
-            cursor.execute("SELECT model, serial_number, location FROM assets WHERE id = ?", (self.asset_id,))
-            asset = cursor.fetchone()
+            asset = details or self.repository.get_edit_details(self.asset_id)
             if asset:
-                self.asset_model.value = asset[0] or ""
-                self.asset_serial_number.value = asset[1] or ""
-                self.asset_location.value = asset[2] or ""
-                print(f"Loaded asset: model={self.asset_model.value}, serial={self.asset_serial_number.value}, location={self.asset_location.value}")
+                model, serial_number, location, image_digest = asset
+                self.asset_model.value = model or ""
+                self.asset_serial_number.value = serial_number or ""
+                self.asset_location.value = location or ""
+                if image_digest:
+                    show_thumbnail(self.image_display, digest=image_digest)
+                logger.debug("Loaded asset %s: serial=%s", self.asset_id, self.asset_serial_number.value)
             else:
                 self.error_popup.content = ft.Text(f"Asset with ID {self.asset_id} not found.")
                 self.error_popup.open = True
-            self.page.update()
+            self.updates.request()
         except Exception as e:
             self.error_popup.content = ft.Text(f"Error loading asset: {e}")
             self.error_popup.open = True
-        finally:
-            cursor.close()
 
+    @batch_updates
     def handle_asset_image(self, e: ft.FilePickerResultEvent):
         self.attached_images = e.files if e.files else []
+        self.attached_image_bytes = None
         self.asset_image_button.text = f"{len(self.attached_images)} image(s) selected."
-        self.image_display.src_base64 = None
+        clear_thumbnail(self.image_display)
         self.warning_text.value = ""
         if self.attached_images:
             file = self.attached_images[0]
@@ -94,26 +117,26 @@ class AssetEditPage:
                 if not self.page.web and hasattr(file, 'path'):
                     with open(file.path, "rb") as f:
                         self.attached_image_bytes = f.read()
-                    self.image_display.src_base64 = base64.b64encode(self.attached_image_bytes).decode('utf-8')
+                    show_thumbnail(self.image_display, self.attached_image_bytes)
                     self.warning_text.value = "Image selected successfully."
                 else:
                     # Handle mobile case where path might not be available
                     if file and hasattr(file, 'bytes'):
                         self.attached_image_bytes = file.bytes
-                        self.image_display.src_base64 = base64.b64encode(self.attached_image_bytes).decode('utf-8')
+                        show_thumbnail(self.image_display, self.attached_image_bytes)
                         self.warning_text.value = "Image selected successfully (mobile)."
                     else:
                         self.warning_text.value = "Failed to load image on mobile."
             except Exception as ex:
                 self.warning_text.value = f"Error reading file: {ex}"
-            self.image_display.update()
-        self.warning_text.update()
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def handle_bill_image(self, e: ft.FilePickerResultEvent):
         self.attached_bills = e.files if e.files else []
+        self.attached_bill_bytes = None
         self.asset_bill_button.text = f"{len(self.attached_bills)} bill(s) selected."
-        self.bill_display.src_base64 = None
+        clear_thumbnail(self.bill_display)
         self.bill_warning_text.value = ""
         if self.attached_bills:
             file = self.attached_bills[0]
@@ -121,118 +144,78 @@ class AssetEditPage:
                 if not self.page.web and hasattr(file, 'path'):
                     with open(file.path, "rb") as f:
                         self.attached_bill_bytes = f.read()
-                    self.bill_display.src_base64 = base64.b64encode(self.attached_bill_bytes).decode('utf-8')
+                    show_thumbnail(self.bill_display, self.attached_bill_bytes)
                     self.bill_warning_text.value = "Bill selected successfully."
                 else:
                     if file and hasattr(file, 'bytes'):
                         self.attached_bill_bytes = file.bytes
-                        self.bill_display.src_base64 = base64.b64encode(self.attached_bill_bytes).decode('utf-8')
+                        show_thumbnail(self.bill_display, self.attached_bill_bytes)
                         self.bill_warning_text.value = "Bill selected successfully (mobile)."
                     else:
                         self.bill_warning_text.value = "Failed to load bill on mobile."
             except Exception as ex:
                 self.bill_warning_text.value = f"Error reading file: {ex}"
-            self.bill_display.update()
-        self.bill_warning_text.update()
-        self.page.update()
+        self.updates.request()
 
-    def close_dialog(self, event):
-        self.dialog.open = False
+    def reset_attachments(self):
+        # The editor is reused across assets, so the previous asset's file must not be saved again
         self.attached_images = []
         self.attached_bills = []
+        self.attached_image_bytes = None
+        self.attached_bill_bytes = None
         self.asset_image_button.text = "Select Image"
         self.asset_bill_button.text = "Upload Bill"
-        self.image_display.src_base64 = None
-        self.bill_display.src_base64 = None
+        clear_thumbnail(self.image_display)
+        clear_thumbnail(self.bill_display)
         self.warning_text.value = ""
         self.bill_warning_text.value = ""
+
+    @batch_updates
+    def close_dialog(self, event):
         self.close_success_popup(event)
-        self.page.update()
 
+    @batch_updates
     def close_error_popup(self, event):
         self.error_popup.open = False
         self.dialog.open = False
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def close_success_popup(self, event):
         self.success_popup.open = False
         self.dialog.open = False
-        self.attached_images = []
-        self.attached_bills = []
-        self.asset_image_button.text = "Select Image"
-        self.asset_bill_button.text = "Upload Bill"
-        self.image_display.src_base64 = None
-        self.bill_display.src_base64 = None
-        self.warning_text.value = ""
-        self.bill_warning_text.value = ""
-        if self.parent and hasattr(self.parent, 'refresh_local_assets'):
-            self.parent.refresh_local_assets()
-        self.page.update()
+        self.reset_attachments()
+        self.updates.request()
 
+    @batch_updates
     def save_asset(self, event):
         if not self.asset_id:
             self.error_popup.content = ft.Text("No asset selected for editing.")
             self.error_popup.open = True
-            self.page.update()
+            self.updates.request()
             return
 
-        cursor = self.local_db.cursor()
         try:
-            cursor.execute("BEGIN TRANSACTION")
-            # Update asset location
-            cursor.execute("UPDATE assets SET location = ? WHERE id = ?", (self.asset_location.value or "", self.asset_id))
-            print(f"Updated location for asset_id {self.asset_id} to {self.asset_location.value}")
-
-            if self.attached_images and hasattr(self, 'attached_image_bytes'):
-                # Find the existing image for this asset_id
-                cursor.execute("SELECT id, image_name FROM asset_images WHERE asset_id = ? LIMIT 1", (self.asset_id,))
-                existing_image = cursor.fetchone()
-                img_name = os.path.basename(self.attached_images[0].name) if self.attached_images else "updated_image.jpg"
-                if existing_image:
-                    image_id, existing_name = existing_image
-                    # Update the existing image with the new data
-                    cursor.execute("""
-                        UPDATE asset_images SET image_data = ?, image_name = ?, last_sync = ? WHERE id = ?
-                    """, (self.attached_image_bytes, img_name, time.strftime("%Y-%m-%d %H:%M:%S"), image_id))
-                    print(f"Updated existing image {img_name} for asset_id {self.asset_id} with id {image_id}")
-                else:
-                    # Insert new image only if no existing image found
-                    cursor.execute("""
-                        INSERT INTO asset_images (asset_id, image_name, image_data, last_sync)
-                        VALUES (?, ?, ?, ?)
-                    """, (self.asset_id, img_name, self.attached_image_bytes, time.strftime("%Y-%m-%d %H:%M:%S")))
-                    print(f"Inserted new image {img_name} for asset_id {self.asset_id}")
-
-            if self.attached_bills and hasattr(self, 'attached_bill_bytes'):
-                cursor.execute("SELECT id, bill_name FROM asset_bills WHERE asset_id = ? LIMIT 1", (self.asset_id,))
-                existing_bill = cursor.fetchone()
-                bill_name = os.path.basename(self.attached_bills[0].name) if self.attached_bills else "updated_bill.pdf"
-                if existing_bill:
-                    bill_id, existing_name = existing_bill
-                    cursor.execute("""
-                        UPDATE asset_bills SET bill_data = ?, bill_name = ?, last_sync = ? WHERE id = ?
-                    """, (self.attached_bill_bytes, bill_name, time.strftime("%Y-%m-%d %H:%M:%S"), bill_id))
-                else:
-                    cursor.execute("""
-                        INSERT INTO asset_bills (asset_id, bill_name, bill_data, last_sync)
-                        VALUES (?, ?, ?, ?)
-                    """, (self.asset_id, bill_name, self.attached_bill_bytes, time.strftime("%Y-%m-%d %H:%M:%S")))
+            image = None
+            if self.attached_images and self.attached_image_bytes is not None:
+                img_name = os.path.basename(self.attached_images[0].name)
+                image = (img_name, store_attachment(self.attached_image_bytes))
+            bill = None
+            if self.attached_bills and self.attached_bill_bytes is not None:
+                bill_name = os.path.basename(self.attached_bills[0].name)
+                bill = (bill_name, store_attachment(self.attached_bill_bytes))
+            self.repository.update_asset(self.asset_id, self.asset_location.value or "", image=image, bill=bill)
+            logger.debug("Updated location for asset_id %s to %s", self.asset_id, self.asset_location.value)
 
-            self.local_db.commit()
             # Show success popup before closing the dialog
             self.success_popup.content = ft.Text("Asset updated locally!")
             self.success_popup.open = True
-            self.page.update()
-            # Ensure parent refreshes the table
-            if self.parent and hasattr(self.parent, 'refresh_local_assets'):
-                self.parent.refresh_local_assets()
+            # Patch only this asset's row; the update below sends it with the popup
+            if self.parent and hasattr(self.parent, 'apply_asset_change'):
+                self.parent.apply_asset_change(self.asset_id)
         except Exception as e:
-            self.local_db.rollback()
             self.error_popup.content = ft.Text(f"Error updating asset: {e}")
             self.error_popup.open = True
-            print(f"Save failed: {e}")
-        finally:
-            cursor.close()
-            # Close the dialog after the popup is shown
-            self.dialog.open = False
-            self.page.update()
+            logger.error("Save failed: %s", e)
+        self.dialog.open = False
+        self.updates.request()
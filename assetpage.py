@@ -1,25 +1,32 @@
 
+import logging
 import os
 import flet as ft
 import sqlite3
-import base64
-import time
 from datetime import datetime
-from sync_server import initialize_local_db, sync_from_server, sync_to_server
+from repository import get_repository
+from sync_server import store_attachment
+from thumbnails import clear_thumbnail, show_thumbnail
+from ui_updates import add_overlays, batch_updates, get_update_scheduler, remove_overlays
+from sync_worker import run_sync_dialog
+
+logger = logging.getLogger(__name__)
 
 class AssetFormPage:
-    def __init__(self, page: ft.Page, parent=None, local_db=None):
+    def __init__(self, page: ft.Page, parent=None, repository=None):
         if page is None:
             raise ValueError("Page object must be provided to AssetFormPage")
         self.page = page
         self.parent = parent
-        self.local_db = local_db or sqlite3.connect("assets.db", check_same_thread=False)
-        initialize_local_db(self.local_db)
+        self.repository = repository or get_repository()
+        self.updates = get_update_scheduler(page)
         self.attached_images = []
         self.attached_bills = []
+        self.attached_image_bytes = None
+        self.attached_bill_bytes = None
         self.TEMP_DIR = os.path.join(os.getcwd(), "temp")
         os.makedirs(self.TEMP_DIR, exist_ok=True)
-        print(f"Initialized TEMP_DIR: {self.TEMP_DIR}, writable: {os.access(self.TEMP_DIR, os.W_OK)}")
+        logger.debug("Initialized TEMP_DIR: %s", self.TEMP_DIR)
 
         # Register custom date adapter for SQLite3 compatibility with Python 3.12+
         sqlite3.register_adapter(datetime, lambda d: d.strftime("%Y-%m-%d %H:%M:%S"))
@@ -62,16 +69,25 @@ class AssetFormPage:
                                     actions=[ft.TextButton("Cancel", on_click=self.close_dialog), ft.TextButton("Save", on_click=self.save_asset)],
                                     actions_alignment=ft.MainAxisAlignment.END)
 
-        self.page.overlay.extend([self.error_popup, self.success_popup, self.sync_dialog, self.asset_image, self.bill_image, self.purchase_date, self.dialog])
+        self.overlays = add_overlays(
+            self.page, self.error_popup, self.success_popup, self.sync_dialog, self.asset_image, self.bill_image, self.purchase_date, self.dialog
+        )
+
+    def dispose(self):
+        """Take this form's dialogs and pickers off the page overlay."""
+        remove_overlays(self.page, self.overlays)
 
+    @batch_updates
     def open_dialog(self):
         self.dialog.open = True
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def handle_asset_image(self, e: ft.FilePickerResultEvent):
         self.attached_images = e.files if e.files else []
+        self.attached_image_bytes = None
         self.asset_image_button.text = f"{len(self.attached_images)} image(s) selected."
-        self.image_display.src_base64 = None
+        clear_thumbnail(self.image_display)
         self.warning_text.value = ""
         if self.attached_images:
             file = self.attached_images[0]
@@ -79,20 +95,20 @@ class AssetFormPage:
                 if not self.page.web and hasattr(file, 'path'):
                     with open(file.path, "rb") as f:
                         self.attached_image_bytes = f.read()
-                    self.image_display.src_base64 = base64.b64encode(self.attached_image_bytes).decode('utf-8')
+                    show_thumbnail(self.image_display, self.attached_image_bytes)
                     self.warning_text.value = "Image selected successfully."
                 else:
                     self.warning_text.value = "File upload not supported in local mode."
             except Exception as ex:
                 self.warning_text.value = f"Error reading file: {ex}"
-            self.image_display.update()
-        self.warning_text.update()
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def handle_bill_image(self, e: ft.FilePickerResultEvent):
         self.attached_bills = e.files if e.files else []
+        self.attached_bill_bytes = None
         self.asset_bill_button.text = f"{len(self.attached_bills)} bill(s) selected."
-        self.bill_display.src_base64 = None
+        clear_thumbnail(self.bill_display)
         self.bill_warning_text.value = ""
         if self.attached_bills:
             file = self.attached_bills[0]
@@ -100,47 +116,49 @@ class AssetFormPage:
                 if not self.page.web and hasattr(file, 'path'):
                     with open(file.path, "rb") as f:
                         self.attached_bill_bytes = f.read()
-                    self.bill_display.src_base64 = base64.b64encode(self.attached_bill_bytes).decode('utf-8')
+                    show_thumbnail(self.bill_display, self.attached_bill_bytes)
                     self.bill_warning_text.value = "Bill selected successfully."
                 else:
                     self.bill_warning_text.value = "File upload not supported in local mode."
             except Exception as ex:
                 self.bill_warning_text.value = f"Error reading file: {ex}"
-            self.bill_display.update()
-        self.bill_warning_text.update()
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def open_date_picker(self, event):
         self.purchase_date.open = True
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def update_purchase_date(self, event):
         if event.control.value:
             self.purchase_date_button.text = f"Purchase Date: {event.control.value.strftime('%Y-%m-%d')}"
         else:
             self.purchase_date_button.text = "Purchase Date"
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def close_dialog(self, event):
         self.dialog.open = False
         self.reset_fields()
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def close_error_popup(self, event):
         self.error_popup.open = False
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def close_success_popup(self, event):
         self.success_popup.open = False
         self.dialog.open = False
         self.reset_fields()
-        if self.parent and hasattr(self.parent, 'refresh_local_assets'):
-            self.parent.refresh_local_assets()
-        self.page.update()
+        self.updates.request()
 
+    @batch_updates
     def close_sync_dialog(self, event):
         self.sync_dialog.open = False
-        self.page.update()
+        self.updates.request()
 
     def reset_fields(self):
         self.asset_model.value = ""
@@ -149,15 +167,18 @@ class AssetFormPage:
         self.asset_location.value = ""
         self.attached_images = []
         self.attached_bills = []
+        self.attached_image_bytes = None
+        self.attached_bill_bytes = None
         self.asset_image_button.text = "Select Image"
         self.asset_bill_button.text = "Upload Bill"
         self.purchase_date_button.text = "Purchase Date"
         self.asset_status.value = "Available"
-        self.image_display.src_base64 = None
-        self.bill_display.src_base64 = None
+        clear_thumbnail(self.image_display)
+        clear_thumbnail(self.bill_display)
         self.warning_text.value = ""
         self.bill_warning_text.value = ""
 
+    @batch_updates
     def save_asset(self, event):
         model = self.asset_model.value
         serial_number = self.asset_serial_number.value
@@ -169,75 +190,35 @@ class AssetFormPage:
         if not all([model, serial_number, company, location, purchase_date]) or purchase_date == "Purchase Date":
             self.error_popup.content = ft.Text("All fields are required.")
             self.error_popup.open = True
+            self.updates.request()
             return
 
-        cursor = self.local_db.cursor()
         try:
-            cursor.execute("BEGIN TRANSACTION")
-            cursor.execute("SELECT id FROM assets WHERE serial_number = ?", (serial_number,))
-            existing_asset = cursor.fetchone()
-
-            if existing_asset:
-                asset_id = existing_asset[0]
-                cursor.execute("""
-                    UPDATE assets SET model = ?, company = ?, location = ?, purchase_date = ?, status = ?, last_sync = ?
-                    WHERE id = ?
-                """, (model, company, location, purchase_date, status, time.strftime("%Y-%m-%d %H:%M:%S"), asset_id))
-            else:
-                cursor.execute("""
-                    INSERT INTO assets (model, serial_number, company, location, purchase_date, status, last_sync)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (model, serial_number, company, location, purchase_date, status, time.strftime("%Y-%m-%d %H:%M:%S")))
-                asset_id = cursor.lastrowid
-
-            if self.attached_images and hasattr(self, 'attached_image_bytes'):
-                cursor.execute("SELECT id, image_name FROM asset_images WHERE asset_id = ?", (asset_id,))
-                existing_images = {row[1]: row[0] for row in cursor.fetchall()}
-                for img in self.attached_images:
-                    if img.name in existing_images:
-                        cursor.execute("""
-                            UPDATE asset_images SET image_data = ?, last_sync = ? WHERE id = ?
-                        """, (self.attached_image_bytes, time.strftime("%Y-%m-%d %H:%M:%S"), existing_images[img.name]))
-                    else:
-                        cursor.execute("""
-                            INSERT INTO asset_images (asset_id, image_name, image_data, last_sync)
-                            VALUES (?, ?, ?, ?)
-                        """, (asset_id, img.name, self.attached_image_bytes, time.strftime("%Y-%m-%d %H:%M:%S")))
-
-            if self.attached_bills and hasattr(self, 'attached_bill_bytes'):
-                cursor.execute("SELECT id, bill_name FROM asset_bills WHERE asset_id = ?", (asset_id,))
-                existing_bills = {row[1]: row[0] for row in cursor.fetchall()}
-                for bill in self.attached_bills:
-                    if bill.name in existing_bills:
-                        cursor.execute("""
-                            UPDATE asset_bills SET bill_data = ?, last_sync = ? WHERE id = ?
-                        """, (self.attached_bill_bytes, time.strftime("%Y-%m-%d %H:%M:%S"), existing_bills[bill.name]))
-                    else:
-                        cursor.execute("""
-                            INSERT INTO asset_bills (asset_id, bill_name, bill_data, last_sync)
-                            VALUES (?, ?, ?, ?)
-                        """, (asset_id, bill.name, self.attached_bill_bytes, time.strftime("%Y-%m-%d %H:%M:%S")))
-
-            self.local_db.commit()
+            images = []
+            if self.attached_images and self.attached_image_bytes is not None:
+                image_digest = store_attachment(self.attached_image_bytes)
+                images = [(img.name, image_digest) for img in self.attached_images]
+            bills = []
+            if self.attached_bills and self.attached_bill_bytes is not None:
+                bill_digest = store_attachment(self.attached_bill_bytes)
+                bills = [(bill.name, bill_digest) for bill in self.attached_bills]
+            asset_id = self.repository.save_asset(
+                model, serial_number, company, location, purchase_date, status, images=images, bills=bills
+            )
             self.success_popup.content = ft.Text("Asset saved locally!")
             self.success_popup.open = True
-            if self.parent and hasattr(self.parent, 'refresh_local_assets'):
-                self.parent.refresh_local_assets()
+            if self.parent and hasattr(self.parent, 'apply_asset_change'):
+                self.parent.apply_asset_change(asset_id)
         except Exception as e:
-            self.local_db.rollback()
             self.error_popup.content = ft.Text(f"Error saving locally: {e}")
             self.error_popup.open = True
-        finally:
-            cursor.close()
+        # One update carries both the popup and the patched list row
+        self.updates.request()
 
+    @batch_updates
     def sync_from_server(self, e):
-        sync_from_server(self.local_db, self.page)
-        self.sync_dialog.content = ft.Text("Sync from server completed!")
-        self.sync_dialog.open = True
-        self.page.update()
+        run_sync_dialog(self.page, self.sync_dialog, "pull", self.close_sync_dialog)
 
+    @batch_updates
     def sync_to_server(self, e):
-        sync_to_server(self.local_db, self.page)
-        self.sync_dialog.content = ft.Text("Sync to server completed!")
-        self.sync_dialog.open = True
-        self.page.update()
+        run_sync_dialog(self.page, self.sync_dialog, "push", self.close_sync_dialog)
@@ -0,0 +1,239 @@
+"""Micro-benchmarks of the local data and UI hot paths, run headless against generated data.
+
+    python benchmarks/bench.py --assets 20000 --output before.json
+    python benchmarks/bench.py --assets 20000 --compare before.json
+
+Each run generates assets.db and its blob store in a temporary directory and works from there,
+so the app's default paths resolve to it. Pages are built on HeadlessPage instead of a Flet
+window, which means times cover building and patching controls but not sending them to the
+client. Results are written as JSON; --compare prints the change in median per case.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import datagen
+
+class HeadlessPage:
+    """Just enough of ft.Page for the app's pages to build and update without a Flet window."""
+
+    web = False
+
+    def __init__(self):
+        self.window = types.SimpleNamespace(width=365, height=600, min_width=360, min_height=600)
+        self.overlay = []
+        self.views = []
+        self.controls = []
+        self.route = "/"
+        self.updates = 0
+
+    def update(self, *controls):
+        self.updates += 1
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+
+    def go(self, route):
+        self.route = route
+
+def measure(run, repeat, warmup=1):
+    """Milliseconds taken by each of repeat calls of run, after warmup untimed calls."""
+    for _ in range(warmup):
+        run()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+def run_benchmarks(args):
+    # Imported here so every module-level default path resolves in the benchmark directory
+    from asset import AssetPage
+    from assetedit import AssetEditPage
+    from repository import AssetRepository, get_repository
+    from thumbnails import LRUCache, get_thumbnail_service
+
+    rng = random.Random(args.seed)
+    repository = get_repository()
+    asset_ids = [row[0] for row in repository.conn.execute("SELECT id FROM assets")]
+    image_digest = repository.conn.execute("SELECT image_sha256 FROM asset_images LIMIT 1").fetchone()
+    results = {}
+
+    def case(name, run, repeat=args.repeat, warmup=1):
+        results[name] = summarize(measure(run, repeat, warmup))
+
+    # Opening the database applies any pending migrations; a new file runs all of them
+    def open_database():
+        AssetRepository("assets.db").conn.close()
+    case("open_database", open_database)
+
+    new_databases = iter(range(1_000_000))
+    def migrate_new_database():
+        path = f"new-{next(new_databases)}.db"
+        AssetRepository(path).conn.close()
+    case("migrate_new_database", migrate_new_database)
+
+    page = HeadlessPage()
+    view = AssetPage(page)
+    case("asset_list_build", view.refresh_local_assets)
+    view.sort_by = "Model"
+    case("asset_list_build_sorted", view.refresh_local_assets)
+    view.sort_by = "Date Added"
+
+    def asset_list_scroll():
+        view.reload_asset_list()
+        for _ in range(args.scroll_pages):
+            view.load_next_page()
+    case("asset_list_scroll", asset_list_scroll)
+
+    def asset_search():
+        # A fragment from the middle of a serial number, as typed into the search box
+        view.search_text = f"{rng.randrange(1, max(2, args.assets)):08d}"[-5:]
+        view.reload_asset_list()
+    case("asset_search", asset_search)
+    view.search_text = ""
+    view.reload_asset_list()
+
+    form = view.add_asset_dialog
+    serials = iter(range(1_000_000))
+    def save_asset():
+        form.asset_model.value = "Bench Model"
+        form.asset_serial_number.value = f"BENCH{next(serials):08d}"
+        form.asset_company.value = "Bench"
+        form.asset_location.value = "Bench Lab"
+        form.purchase_date_button.text = "Purchase Date: 2025-01-01"
+        form.asset_status.value = "Available"
+        form.save_asset(None)
+    case("save_asset_new", save_asset)
+
+    def save_asset_edit():
+        editor = AssetEditPage(page, view, asset_id=rng.choice(asset_ids), repository=repository)
+        editor.asset_location.value = f"Room {rng.randrange(100)}"
+        editor.save_asset(None)
+    case("save_asset_edit", save_asset_edit)
+
+    if asset_ids:
+        case("edit_dialog_open", lambda: view.open_edit_dialog(rng.choice(asset_ids)))
+        # Rows already in the list have their editor data prefetched
+        listed_ids = list(view.row_index)
+        case("edit_dialog_open_listed", lambda: view.open_edit_dialog(rng.choice(listed_ids)))
+
+    if image_digest:
+        service = get_thumbnail_service()
+        digest = image_digest[0]
+
+        def preview():
+            ready = threading.Event()
+            service.request(lambda *_: ready.set(), digest=digest)
+            ready.wait()
+
+        def preview_cold():
+            # Neither cached in memory nor stored: decode the attachment and store its thumbnail
+            service.cache = LRUCache(service.cache.max_entries)
+            with repository.transaction() as cursor:
+                cursor.execute("DELETE FROM thumbnails WHERE sha256 = ?", (digest,))
+            preview()
+
+        def preview_stored():
+            service.cache = LRUCache(service.cache.max_entries)
+            preview()
+
+        case("attachment_preview_cold", preview_cold)
+        case("attachment_preview_stored", preview_stored)
+        case("attachment_preview_cached", preview)
+
+    repository.conn.close()
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    lines = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], result["median_ms"]
+        change = (after - before) / before * 100 if before else 0.0
+        lines.append(f"{name:28} {before:10.3f} -> {after:10.3f} ms  {change:+7.1f}%")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    datagen.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--scroll-pages", type=int, default=10, help="pages loaded by asset_list_scroll")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON of an earlier run to compare medians with")
+    args = parser.parse_args()
+
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="asset-bench-") as directory:
+        datagen.generate_from_args(directory, args)
+        os.chdir(directory)
+        try:
+            # The app reports to the console as it goes; keep that out of the timings' output
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = run_benchmarks(args)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "commit": git_commit(),
+        "started": started,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "parameters": {
+            "assets": args.assets, "images": args.images, "bills": args.bills, "blob_kb": args.blob_kb,
+            "distinct_blobs": args.distinct_blobs, "seed": args.seed, "repeat": args.repeat,
+            "scroll_pages": args.scroll_pages,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        print(compare(results, args.compare), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Synthetic local data for the benchmarks.
+
+    python benchmarks/datagen.py --assets 5000 --images 5000 --bills 2000 --blob-kb 200 path/to/dir
+
+writes assets.db and its attachments/ blob store into the directory, the layout the app expects in
+its working directory.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blobstore import BlobStore
+from repository import connect
+from migrations import migrate
+from sync_server import SQLITE_MAX_PARAMS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+STATUSES = ("Available", "Deployed", "Disposed/Sold")
+COMPANIES = ("Dell", "HP", "Lenovo", "Apple", "Cisco", "Samsung")
+LOCATIONS = ("Head Office", "Warehouse", "Branch 1", "Branch 2", "Lab", "Store Room")
+
+def make_blob(size, rng):
+    """A JPEG of about size bytes when Pillow is available (so previews decode it), random bytes otherwise."""
+    if Image is None:
+        return rng.randbytes(size)
+    # Noise compresses poorly, so the JPEG size follows the pixel count closely
+    side = max(16, int((size / 1.5) ** 0.5))
+    image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+def generate(directory, assets=1000, images=1000, bills=500, blob_kb=100, distinct_blobs=8, seed=1):
+    """Fill directory with a migrated assets.db and blob store; returns the path of the database.
+
+    Images and bills are spread over the first assets round-robin and share distinct_blobs
+    stored files between them, the way re-used photos and bills are deduplicated by digest.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    db_path = os.path.join(directory, "assets.db")
+    store = BlobStore(os.path.join(directory, "attachments"))
+    digests = [store.put(make_blob(blob_kb * 1024, rng)) for _ in range(max(1, distinct_blobs))]
+
+    local_db = connect(db_path)
+    try:
+        migrate(local_db)
+        rows = [
+            (
+                f"Model {rng.randrange(1, 400)}", f"SN{index:08d}", rng.choice(COMPANIES), rng.choice(LOCATIONS),
+                f"20{rng.randrange(15, 25)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+                rng.choice(STATUSES), "2025-01-01 00:00:00",
+            )
+            for index in range(1, assets + 1)
+        ]
+        for start in range(0, len(rows), SQLITE_MAX_PARAMS):
+            local_db.executemany("""
+                INSERT INTO assets (model, serial_number, company, location, purchase_date, status, last_sync)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows[start:start + SQLITE_MAX_PARAMS])
+        for table, name_column, digest_column, count, extension in (
+            ("asset_images", "image_name", "image_sha256", images, "jpg"),
+            ("asset_bills", "bill_name", "bill_sha256", bills, "pdf"),
+        ):
+            if not assets:
+                break
+            local_db.executemany(
+                f"INSERT INTO {table} (asset_id, {name_column}, {digest_column}, last_sync) VALUES (?, ?, ?, ?)",
+                [
+                    (index % assets + 1, f"{table}-{index}.{extension}", digests[index % len(digests)], "2025-01-01 00:00:00")
+                    for index in range(count)
+                ],
+            )
+        local_db.commit()
+    finally:
+        local_db.close()
+    return db_path
+
+def add_arguments(parser):
+    parser.add_argument("--assets", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--bills", type=int, default=500)
+    parser.add_argument("--blob-kb", type=int, default=100, help="approximate size of each attachment")
+    parser.add_argument("--distinct-blobs", type=int, default=8, help="different attachment files to share out")
+    parser.add_argument("--seed", type=int, default=1)
+
+def generate_from_args(directory, args):
+    return generate(
+        directory, assets=args.assets, images=args.images, bills=args.bills,
+        blob_kb=args.blob_kb, distinct_blobs=args.distinct_blobs, seed=args.seed,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("directory")
+    args = parser.parse_args()
+    print(generate_from_args(args.directory, args))
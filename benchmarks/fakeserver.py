@@ -0,0 +1,268 @@
+"""In-process stand-in for the sync MySQL server, for load tests.
+
+The server tables live in one SQLite file (WAL mode) that any number of client processes open.
+FakeConnectionManager replaces sync_connection's pool and hands out FakeConnections, which
+offer the part of the mysql.connector interface sync_server uses and translate its MySQL-only
+SQL. Like InnoDB, reads never wait; a write takes the database write lock until commit or
+rollback, and a client that finds it taken counts a lock wait and queues for it up to
+lock_wait_timeout before failing with MySQL's lock wait timeout error.
+
+Triggers record who last wrote each row, so every change to a row that another client wrote
+last is logged in sync_conflicts.
+"""
+import datetime
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from mysql.connector import errors
+
+SERVER_TABLES = {
+    "assets": ("model", "serial_number", "company", "location", "purchase_date", "status"),
+    "asset_images": ("asset_id", "image_name", "image_data", "image_sha256"),
+    "asset_bills": ("asset_id", "bill_name", "bill_data", "bill_sha256"),
+}
+MAX_ALLOWED_PACKET = 64 * 1024 * 1024
+# MySQL's TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6), as text that sorts and parses like it
+NOW = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+sqlite3.register_converter("TIMESTAMP6", lambda value: datetime.datetime.strptime(value.decode(), "%Y-%m-%d %H:%M:%S.%f"))
+
+_ON_DUPLICATE_KEY = re.compile(r"ON DUPLICATE KEY UPDATE(.*)$", re.S)
+_VALUES = re.compile(r"VALUES\((\w+)\)")
+_INTERVAL_DAYS = re.compile(r"NOW\(\) - INTERVAL \? DAY")
+
+def translate(sql):
+    """Rewrite the MySQL dialect sync_server speaks into SQLite."""
+    sql = sql.replace("%s", "?")
+    match = _ON_DUPLICATE_KEY.search(sql)
+    if match:
+        sql = sql[:match.start()] + "ON CONFLICT DO UPDATE SET " + _VALUES.sub(r"excluded.\1", match.group(1))
+    return _INTERVAL_DAYS.sub("datetime('now', '-' || ? || ' days')", sql)
+
+def _concat(max_allowed_packet, *values):
+    if None in values:
+        return None
+    result = b"".join(value if isinstance(value, bytes) else str(value).encode() for value in values)
+    # MySQL returns NULL (with a warning) for a string result longer than max_allowed_packet
+    return result if len(result) <= max_allowed_packet else None
+
+def _sha2(value, _bits):
+    return None if value is None else hashlib.sha256(value if isinstance(value, bytes) else str(value).encode()).hexdigest()
+
+def create_server(path):
+    """Create the server schema in path as migrate_server.py leaves it."""
+    db = sqlite3.connect(path)
+    db.create_function("current_client", 0, lambda: None)
+    db.execute("PRAGMA journal_mode = WAL")
+    for table, columns in SERVER_TABLES.items():
+        definitions = ", ".join(
+            # Case-insensitive like MySQL's default _ci collations (NOCASE does not also ignore trailing spaces)
+            f"{column} TEXT UNIQUE COLLATE NOCASE" if column == "serial_number" else f"{column} BLOB" if column.endswith("_data") else column
+            for column in columns
+        )
+        db.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY, {definitions},
+                updated_at TIMESTAMP6 NOT NULL DEFAULT ({NOW}), written_by TEXT
+            )
+        """)
+        db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table} (updated_at, id)")
+        changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in columns)
+        db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {table} BEGIN
+                UPDATE {table} SET written_by = current_client() WHERE id = NEW.id;
+            END
+        """)
+        db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE ON {table} WHEN {changed} BEGIN
+                INSERT INTO sync_conflicts (table_name, row_id, overwritten, client)
+                SELECT '{table}', NEW.id, OLD.written_by, current_client()
+                WHERE OLD.written_by IS NOT NULL AND OLD.written_by IS NOT current_client();
+                UPDATE {table} SET updated_at = {NOW}, written_by = current_client() WHERE id = NEW.id;
+            END
+        """)
+    for table in ("asset_images", "asset_bills"):
+        digest_column = "image_sha256" if table == "asset_images" else "bill_sha256"
+        db.execute(f"CREATE INDEX IF NOT EXISTS idx_{digest_column} ON {table} ({digest_column})")
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS attachment_chunks (
+            sha256 TEXT NOT NULL, chunk_offset INTEGER NOT NULL, data BLOB NOT NULL,
+            uploaded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (sha256, chunk_offset)
+        )
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS sync_conflicts (
+            id INTEGER PRIMARY KEY, table_name TEXT, row_id INTEGER, overwritten TEXT, client TEXT
+        )
+    """)
+    db.commit()
+    return db
+
+class ServerStats:
+    """Per-process counts of what the clients' connections did and waited for."""
+
+    def __init__(self):
+        self.statements = 0
+        self.lock_waits = 0
+        self.lock_wait_ms = []
+        self.lock_timeouts = 0
+        self._lock = threading.Lock()
+
+    def count_statement(self):
+        with self._lock:
+            self.statements += 1
+
+    def record_wait(self, milliseconds, timed_out):
+        with self._lock:
+            self.lock_waits += 1
+            self.lock_wait_ms.append(milliseconds)
+            self.lock_timeouts += timed_out
+
+    def as_dict(self):
+        return {
+            "statements": self.statements,
+            "lock_waits": self.lock_waits,
+            "lock_wait_ms": self.lock_wait_ms,
+            "lock_timeouts": self.lock_timeouts,
+        }
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        self.connection.round_trip()
+        self.connection.stats.count_statement()
+        self._rows = []
+        statement = sql.lstrip().split(None, 1)[0].upper()
+        if statement == "BEGIN":
+            # Starting a transaction implicitly commits the open one
+            self.connection.commit()
+            return
+        if "@@max_allowed_packet" in sql:
+            self._rows = [(self.connection.max_allowed_packet,)]
+            return
+        if "information_schema" in sql:
+            # Every (table, column) of the file; callers look up the ones they need
+            self._rows = self.connection.columns()
+            return
+        size = len(sql) + sum(len(value) for value in params if isinstance(value, (bytes, str)))
+        if size > self.connection.max_allowed_packet:
+            raise errors.OperationalError(msg="Got a packet bigger than 'max_allowed_packet' bytes", errno=1153)
+        if statement in ("CREATE", "ALTER", "DROP"):
+            # DDL commits implicitly
+            self.connection.commit()
+            self.connection.begin_write()
+            self._run(sql, params)
+            self.connection.commit()
+            return
+        if statement in ("INSERT", "UPDATE", "DELETE", "REPLACE"):
+            self.connection.begin_write()
+        self._run(sql, params)
+
+    def _run(self, sql, params):
+        try:
+            cursor = self.connection.db.execute(translate(sql), params)
+            self._rows = cursor.fetchall()
+            self.rowcount = cursor.rowcount
+            self.lastrowid = cursor.lastrowid
+        except sqlite3.IntegrityError as e:
+            raise errors.IntegrityError(msg=str(e), errno=1062) from e
+        except sqlite3.Error as e:
+            raise errors.DatabaseError(msg=str(e)) from e
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._rows = []
+
+class FakeConnection:
+    def __init__(self, path, client, stats, latency=0.0, lock_wait_timeout=50.0, max_allowed_packet=MAX_ALLOWED_PACKET):
+        self.stats = stats
+        self.latency = latency
+        self.max_allowed_packet = max_allowed_packet
+        # Readers can also meet a brief lock, e.g. while the WAL is checkpointed
+        self.busy_timeout = int(lock_wait_timeout * 1000)
+        self.db = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=lock_wait_timeout,
+        )
+        self.db.create_function("current_client", 0, lambda: client)
+        self.db.create_function("CONCAT", -1, lambda *values: _concat(max_allowed_packet, *values))
+        self.db.create_function("SHA2", 2, _sha2)
+
+    def columns(self):
+        tables = [row[0] for row in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return [(table, row[1]) for table in tables for row in self.db.execute(f"PRAGMA table_info({table})")]
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def begin_write(self):
+        if self.db.in_transaction:
+            return
+        # Try without waiting first, so only a write lock held by another client counts as a wait
+        self.db.execute("PRAGMA busy_timeout = 0")
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise errors.DatabaseError(msg=str(e)) from e
+        finally:
+            self.db.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        start = time.perf_counter()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            self.stats.record_wait((time.perf_counter() - start) * 1000, True)
+            raise errors.DatabaseError(msg="Lock wait timeout exceeded; try restarting transaction", errno=1205) from e
+        self.stats.record_wait((time.perf_counter() - start) * 1000, False)
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        if self.db.in_transaction:
+            self.round_trip()
+            self.db.execute("COMMIT")
+
+    def rollback(self):
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+    def close(self):
+        self.rollback()
+        self.db.close()
+
+class FakeConnectionManager:
+    """Drop-in for SyncConnectionManager that connects to the server file at path as client."""
+
+    def __init__(self, path, client, pool_size=3, latency=0.0, lock_wait_timeout=50.0, max_allowed_packet=MAX_ALLOWED_PACKET):
+        self.path = path
+        self.client = client
+        self.pool_size = pool_size
+        self.stats = ServerStats()
+        self._connect_args = {
+            "latency": latency, "lock_wait_timeout": lock_wait_timeout, "max_allowed_packet": max_allowed_packet,
+        }
+
+    def acquire(self):
+        return FakeConnection(self.path, self.client, self.stats, **self._connect_args)
+
+    def release(self, conn):
+        conn.close()
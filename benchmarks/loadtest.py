@@ -0,0 +1,263 @@
+"""Sync load test: N simulated field devices syncing at once against the in-process fake server.
+
+    python benchmarks/loadtest.py --clients 24 --rounds 3 --latency-ms 20 --output load.json
+
+Every client is a separate process with its own working directory, assets.db and blob store,
+connected through fakeserver.FakeConnectionManager to one shared server file. Clients start
+together, pull everything, then run --rounds of: make local edits (new assets with an image,
+and location changes to a set of assets every client shares), push, pull.
+
+The JSON report has sync throughput, latency percentiles per kind of sync, the server write
+lock waits and timeouts, conflicts (changes to a row another client wrote last), failures and
+lost rows: assets and images a client created and pushed that the server does not hold with
+the same content. The run exits with an error when any row was lost.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import fakeserver
+from bench import git_commit
+
+def seed_server(path, assets, images, blob_kb, seed):
+    rng = random.Random(seed)
+    db = fakeserver.create_server(path)
+    db.executemany(
+        "INSERT INTO assets (model, serial_number, company, location, purchase_date, status) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"Model {index % 97}", f"SRV{index:07d}", "Dell", "Head Office", "2024-01-01", "Available") for index in range(1, assets + 1)],
+    )
+    blobs = [rng.randbytes(blob_kb * 1024) for _ in range(4)]
+    digests = [hashlib.sha256(blob).hexdigest() for blob in blobs]
+    db.executemany(
+        "INSERT INTO asset_images (asset_id, image_name, image_data, image_sha256) VALUES (?, ?, ?, ?)",
+        [(index % assets + 1, f"server-{index}.jpg", blobs[index % 4], digests[index % 4]) for index in range(images)] if assets else [],
+    )
+    db.commit()
+    db.close()
+
+def run_client(name, directory, server_path, args, start_barrier, results):
+    """Body of one client process; puts its timings and server-side counts, or its error, on results."""
+    try:
+        results.put(_run_client(name, directory, server_path, args, start_barrier))
+    except BaseException:
+        # Release the other clients from the start barrier rather than leave them waiting
+        start_barrier.abort()
+        results.put({"client": name, "error": traceback.format_exc()})
+
+def _run_client(name, directory, server_path, args, start_barrier):
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    # Keep the app's console output out of the report
+    sys.stdout = open(os.devnull, "w")
+    import sync_connection
+    import sync_server
+    from repository import AssetRepository, connect
+
+    connections = fakeserver.FakeConnectionManager(
+        server_path, name, pool_size=args.pool_size, latency=args.latency_ms / 1000,
+        lock_wait_timeout=args.lock_wait_timeout,
+    )
+    sync_connection._manager = connections
+    rng = random.Random(f"{args.seed}-{name}")
+    repository = AssetRepository("assets.db")
+    local_db = connect("assets.db", timeout=30)
+    operations = []
+    # (serial number, image name, digest) of every asset this client creates
+    created = []
+
+    def timed(kind, sync):
+        start = time.perf_counter()
+        try:
+            result = sync(local_db, None)
+            ok, message, progress = result.ok, result.message, result.progress
+        except Exception as e:
+            ok, message, progress = False, f"{type(e).__name__}: {e}", None
+        counts = list(progress.tables.values()) if progress else []
+        operations.append({
+            "kind": kind,
+            "ms": (time.perf_counter() - start) * 1000,
+            "ok": ok,
+            "message": message,
+            "rows": sum(rows for rows, _ in counts),
+            "bytes": sum(nbytes for _, nbytes in counts),
+        })
+
+    start_barrier.wait()
+    started = time.time()
+    timed("initial_pull", sync_server.sync_from_server)
+    shared = [row[0] for row in repository.conn.execute(
+        "SELECT id FROM assets WHERE serial_number LIKE 'SRV%' ORDER BY serial_number LIMIT ?", (args.shared_assets,)
+    )]
+    for round_number in range(args.rounds):
+        for edit in range(args.edits):
+            if shared and edit % 2:
+                repository.update_asset(rng.choice(shared), f"{name} desk {round_number}-{edit}")
+            else:
+                digest = sync_server.store_attachment(rng.randbytes(args.blob_kb * 1024))
+                serial_number = f"{name}-{round_number}-{edit}"
+                repository.save_asset(
+                    "Field Model", serial_number, "Field Co", f"{name} site", "2025-01-01",
+                    "Deployed", images=[(f"{serial_number}.jpg", digest)],
+                )
+                created.append((serial_number, f"{serial_number}.jpg", digest))
+        timed("push", sync_server.sync_to_server)
+        timed("pull", sync_server.sync_from_server)
+    finished = time.time()
+    # Rows a failed last push left in the outbox never reached the server and are not counted as lost
+    unpushed = {row[0] for row in local_db.execute("""
+        SELECT serial_number FROM assets WHERE id IN (SELECT row_id FROM sync_outbox WHERE table_name = 'assets')
+        UNION SELECT serial_number FROM assets WHERE id IN (
+            SELECT asset_id FROM asset_images WHERE id IN (SELECT row_id FROM sync_outbox WHERE table_name = 'asset_images')
+        )
+    """)}
+    local_db.close()
+    return {
+        "client": name, "started": started, "finished": finished,
+        "operations": operations, "server": connections.stats.as_dict(),
+        "pushed": [row for row in created if row[0] not in unpushed], "unpushed": len(unpushed),
+    }
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(share):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * share))], 3)
+
+    return {
+        "count": len(ordered), "p50_ms": at(0.50), "p90_ms": at(0.90), "p95_ms": at(0.95),
+        "p99_ms": at(0.99), "max_ms": round(ordered[-1], 3),
+    }
+
+def lost_rows(reports, server):
+    """Assets and images the clients pushed that the server lacks, or holds with other content."""
+    pushed = {serial_number: (image_name, digest) for client in reports for serial_number, image_name, digest in client["pushed"]}
+    intact = set()
+    serial_numbers = list(pushed)
+    for start in range(0, len(serial_numbers), 500):
+        chunk = serial_numbers[start:start + 500]
+        for serial_number, image_name, digest, data in server.execute(f"""
+            SELECT serial_number, image_name, image_sha256, image_data FROM assets
+            JOIN asset_images ON asset_images.asset_id = assets.id
+            WHERE serial_number IN ({', '.join('?' * len(chunk))})
+        """, chunk):
+            if (image_name, digest) == pushed[serial_number] and data and hashlib.sha256(data).hexdigest() == digest:
+                intact.add(serial_number)
+    held_assets = {row[0] for row in server.execute("SELECT serial_number FROM assets")}
+    missing_assets = sorted(set(pushed) - held_assets)
+    missing_images = sorted(set(pushed) - intact)
+    return {
+        "pushed": len(pushed),
+        "unpushed": sum(client["unpushed"] for client in reports),
+        "assets": len(missing_assets),
+        "asset_images": len(missing_images),
+        "examples": (missing_assets + missing_images)[:10],
+    }
+
+def report(args, reports, server_path):
+    operations = [operation for client in reports for operation in client["operations"]]
+    wall = max(client["finished"] for client in reports) - min(client["started"] for client in reports)
+    ok = [operation for operation in operations if operation["ok"]]
+    failures = [operation for operation in operations if not operation["ok"]]
+    waits = [wait for client in reports for wait in client["server"]["lock_wait_ms"]]
+    server = sqlite3.connect(server_path)
+    conflicts = dict(server.execute("SELECT table_name, COUNT(*) FROM sync_conflicts GROUP BY table_name").fetchall())
+    server_rows = {table: server.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in fakeserver.SERVER_TABLES}
+    lost = lost_rows(reports, server)
+    server.close()
+    return {
+        "commit": git_commit(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(min(client["started"] for client in reports))),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "wall_seconds": round(wall, 3),
+        "throughput": {
+            "syncs_per_second": round(len(ok) / wall, 3),
+            "rows_per_second": round(sum(operation["rows"] for operation in ok) / wall, 1),
+            "mb_per_second": round(sum(operation["bytes"] for operation in ok) / wall / 1024 / 1024, 3),
+            "statements_per_second": round(sum(client["server"]["statements"] for client in reports) / wall, 1),
+        },
+        "latency_ms": {
+            kind: percentiles([operation["ms"] for operation in ok if operation["kind"] == kind])
+            for kind in ("initial_pull", "push", "pull")
+        },
+        "lock_waits": {
+            **percentiles(waits),
+            "total_ms": round(sum(waits), 3),
+            "timeouts": sum(client["server"]["lock_timeouts"] for client in reports),
+        },
+        "conflicts": {"total": sum(conflicts.values()), **conflicts},
+        "failures": {
+            "count": len(failures),
+            **{kind: sum(operation["kind"] == kind for operation in failures) for kind in ("initial_pull", "push", "pull")},
+            "messages": sorted({operation["message"] for operation in failures})[:10],
+        },
+        "server_rows": server_rows,
+        "lost_rows": lost,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=3, help="edit/push/pull cycles per client")
+    parser.add_argument("--edits", type=int, default=10, help="local edits per round")
+    parser.add_argument("--server-assets", type=int, default=2000)
+    parser.add_argument("--server-images", type=int, default=500)
+    parser.add_argument("--shared-assets", type=int, default=20, help="server assets every client edits")
+    parser.add_argument("--blob-kb", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated round trip per statement")
+    parser.add_argument("--pool-size", type=int, default=3, help="server connections per client")
+    parser.add_argument("--lock-wait-timeout", type=float, default=50.0, help="seconds, as innodb_lock_wait_timeout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # Spawned clients start clean, without the parent's module state
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="asset-load-") as directory:
+        server_path = os.path.join(directory, "server.db")
+        seed_server(server_path, args.server_assets, args.server_images, args.blob_kb, args.seed)
+        start_barrier = context.Barrier(args.clients)
+        results = context.Queue()
+        clients = [
+            context.Process(
+                target=run_client,
+                args=(f"client{number:03d}", os.path.join(directory, f"client{number:03d}"), server_path, args, start_barrier, results),
+            )
+            for number in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        reports = [results.get() for _ in clients]
+        for client in clients:
+            client.join()
+        errors = [client for client in reports if "error" in client]
+        if errors:
+            sys.exit(f"{len(errors)} of {len(clients)} clients failed; first error from {errors[0]['client']}:\n{errors[0]['error']}")
+        results = report(args, reports, server_path)
+        output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    lost = results["lost_rows"]
+    if lost["assets"] or lost["asset_images"]:
+        sys.exit(f"Lost {lost['assets']} of {lost['pushed']} pushed assets and {lost['asset_images']} of their images")
+
+if __name__ == "__main__":
+    main()
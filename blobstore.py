@@ -0,0 +1,108 @@
+import hashlib
+import mmap
+import os
+import tempfile
+
+ATTACHMENTS_DIR = "attachments"
+
+_default_store = None
+
+class BlobStore:
+    """Content-addressed attachment files named by SHA-256 digest under two levels of shard directories."""
+
+    def __init__(self, root=ATTACHMENTS_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def size(self, digest):
+        return os.path.getsize(self.path(digest))
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated blob under its digest
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def read(self, digest):
+        try:
+            with open(self.path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def open(self, digest):
+        """Memory-map a blob read-only; returns None when it is missing. Close the map when done."""
+        try:
+            with open(self.path(digest), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"")
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    def partial_path(self, digest):
+        return os.path.join(self.root, "partial", digest + ".part")
+
+    def partial_size(self, digest):
+        """Bytes of an interrupted download of digest already on disk; the offset to resume from."""
+        try:
+            return os.path.getsize(self.partial_path(digest))
+        except FileNotFoundError:
+            return 0
+
+    def append_partial(self, digest, offset, data):
+        """Write a downloaded chunk at offset and flush it to disk before the next one is requested."""
+        path = self.partial_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            # Anything past offset is a chunk whose write was interrupted
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def finish_partial(self, digest):
+        """Move a completed download into the store under its actual digest and return that digest."""
+        path = self.partial_path(digest)
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        actual = sha.hexdigest()
+        target = self.path(actual)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        return actual
+
+    def discard_partial(self, digest):
+        if os.path.exists(self.partial_path(digest)):
+            os.remove(self.partial_path(digest))
+
+def get_blob_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = BlobStore()
+    return _default_store
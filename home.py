@@ -1,8 +1,9 @@
 
 import flet as ft
-import sqlite3
 from assetpage import AssetFormPage
-from sync_server import initialize_local_db, sync_from_server, sync_to_server
+from repository import get_repository
+from sync_worker import run_sync_dialog
+from ui_updates import add_overlays, batch_updates, get_update_scheduler, remove_overlays
 
 class Home(ft.Container):
     def __init__(self, page, **kwargs):
@@ -10,9 +11,9 @@ class Home(ft.Container):
         self.page = page
         self.padding = 0
 
-        self.local_db = sqlite3.connect("assets.db", check_same_thread=False)
-        initialize_local_db(self.local_db)
-        self.add_asset_dialog = AssetFormPage(self.page, self, local_db=self.local_db)
+        self.repository = get_repository()
+        self.updates = get_update_scheduler(page)
+        self.add_asset_dialog = AssetFormPage(self.page, self, repository=self.repository)
 
         self.asset_button = ft.ElevatedButton(
             text="Asset", icon=ft.Icons.ADD, on_click=lambda e: self.page.go("/asset"),
@@ -47,7 +48,7 @@ class Home(ft.Container):
             actions=[ft.TextButton("OK", on_click=self.close_sync_dialog)],
             actions_alignment=ft.MainAxisAlignment.END
         )
-        self.page.overlay.append(self.sync_dialog)
+        self.overlays = add_overlays(self.page, self.sync_dialog)
 
         self.content_area = ft.Container(
             content=ft.Column(
@@ -63,18 +64,23 @@ class Home(ft.Container):
 
         self.content = ft.Column(controls=[self.content_area], expand=True, spacing=0)
 
+    def show(self):
+        """Called on every visit to the cached view; the home screen has nothing to reload."""
+
+    def dispose(self):
+        """Take this view's dialogs, and those of its add form, off the page overlay."""
+        self.add_asset_dialog.dispose()
+        remove_overlays(self.page, self.overlays)
+
+    @batch_updates
     def sync_from_server(self, e=None):
-        sync_from_server(self.local_db, self.page)
-        self.sync_dialog.content = ft.Text("Sync from server completed!")
-        self.sync_dialog.open = True
-        self.page.update()
+        run_sync_dialog(self.page, self.sync_dialog, "pull", self.close_sync_dialog)
 
+    @batch_updates
     def sync_to_server(self, e=None):
-        sync_to_server(self.local_db, self.page)
-        self.sync_dialog.content = ft.Text("Sync to server completed!")
-        self.sync_dialog.open = True
-        self.page.update()
+        run_sync_dialog(self.page, self.sync_dialog, "push", self.close_sync_dialog)
 
+    @batch_updates
     def close_sync_dialog(self, e):
         self.sync_dialog.open = False
-        self.page.update()
+        self.updates.request()
@@ -1,18 +1,66 @@
+import importlib
+import logging
+import os
+import sys
+# perf comes first so ui_trace's clock starts before the heavy imports
+from perf import export_trace, instrument_page, ui_trace
 
-import flet as ft
-from home import Home
-from assetpage import AssetFormPage
-import sqlite3
-from asset import AssetPage
-from sync_server import initialize_local_db
+with ui_trace.phase("import flet"):
+    import flet as ft
+from ui_updates import get_update_scheduler
 
-# View factories dictionary
+# ASSET_PROFILE_STARTUP=1 logs the time to main() and to the first rendered view with the traced
+# imports and phases, and writes them to the sync trace_dir when one is set. For a per-module
+# breakdown of the imports run python -X importtime main.py.
+PROFILE_STARTUP = os.environ.get("ASSET_PROFILE_STARTUP", "") not in ("", "0")
+
+# ASSET_LOG_LEVEL=DEBUG also logs the duration of every traced UI phase
+logging.basicConfig(level=os.environ.get("ASSET_LOG_LEVEL", "INFO" if PROFILE_STARTUP else "WARNING").upper())
+logger = logging.getLogger(__name__)
+
+def lazy_view(module_name, class_name):
+    """View factory that imports the view's module on first use, so a cold start loads only the first screen."""
+    def build(page):
+        if module_name not in sys.modules:
+            with ui_trace.phase(f"import {module_name}"):
+                importlib.import_module(module_name)
+        return getattr(sys.modules[module_name], class_name)(page)
+    return build
+
+home_view = lazy_view("home", "Home")
+asset_view = lazy_view("asset", "AssetPage")
+
+# Route -> (view factory, options for the view's show() hook). Each factory's view is built once
+# per session and shared by the routes that name it.
 VIEW_FACTORIES = {
-    "/": lambda p: Home(p),
-    "/asset": lambda p: AssetPage(p),
+    "/": (home_view, {}),
+    "/asset": (asset_view, {}),
+    "/asset/search": (asset_view, {"show_search": True}),
 }
 
+def report_startup(main_called):
+    """Log, and export when a trace_dir is configured, how long startup took up to the first view."""
+    first_render = ui_trace.elapsed
+    logger.info("Startup: main() after %.2f s, first view after %.2f s. %s", main_called, first_render, ui_trace.summary(slowest=6))
+    data = {
+        **ui_trace.to_dict(),
+        "main_called_s": round(main_called, 4),
+        "first_render_s": round(first_render, 4),
+        "modules_loaded": len(sys.modules),
+        "sync_stack_loaded": "mysql.connector" in sys.modules,
+    }
+    from sync_connection import load_sync_config
+    trace_dir = load_sync_config()["trace_dir"]
+    if trace_dir:
+        try:
+            logger.info("Startup trace written to %s", export_trace(data, trace_dir, "startup"))
+        except OSError as e:
+            logger.warning("Could not write startup trace: %s", e)
+
 def main(page: ft.Page):
+    main_called = ui_trace.elapsed
+    instrument_page(page)
+    updates = get_update_scheduler(page)
     page.title = "IT Asset Manager"
     page.window.width = 365
     page.window.height = 600
@@ -54,38 +102,66 @@ def main(page: ft.Page):
                     icon=ft.Icon(ft.Icons.MENU_BOOK, color=ft.Colors.WHITE),
                     tooltip="Menu Options",
                 ),
-                ft.IconButton(icon=ft.Icons.SEARCH, icon_color=ft.Colors.WHITE, tooltip="Search"),
+                ft.IconButton(icon=ft.Icons.SEARCH, icon_color=ft.Colors.WHITE, tooltip="Search", on_click=lambda e: page.go("/asset/search")),
                 ft.Container(expand=True),
                 ft.IconButton(icon=ft.Icons.FAVORITE, icon_color=ft.Colors.WHITE, tooltip="Favorites"),
             ],
         ),
     )
 
+    startup_pending = [PROFILE_STARTUP]
+    # Factory -> the ft.View around its view, kept for the session so navigating swaps views
+    # and calls their show() hook instead of rebuilding them and their dialogs
+    views = {}
+
     def change_route(e: ft.RouteChangeEvent):
         route = e.route
-        print(f"Changing route to: {route}")
+        logger.debug("Changing route to: %s", route)
         if route not in VIEW_FACTORIES:
             route = "/"
-        new_content = VIEW_FACTORIES[route](page)
-        page.views.clear()
-        page.views.append(
-            ft.View(
-                route=route,
-                controls=[new_content],
-                appbar=page.appbar,
-                bottom_appbar=page.bottom_appbar,
-            )
-        )
-        page.update()
+        factory, options = VIEW_FACTORIES[route]
+        # The view and everything it requests go out as one update
+        with ui_trace.phase(f"route {route}"), updates.batch():
+            view = views.get(factory)
+            if view is None:
+                content = factory(page)
+                view = views[factory] = ft.View(
+                    route=route,
+                    controls=[content],
+                    appbar=page.appbar,
+                    bottom_appbar=page.bottom_appbar,
+                )
+            else:
+                content = view.controls[0]
+                # Flet clears the page of a control when it leaves the screen
+                content.page = page
+            view.route = route
+            content.show(**options)
+            page.views.clear()
+            page.views.append(view)
+            updates.request()
+        if startup_pending[0]:
+            startup_pending[0] = False
+            report_startup(main_called)
 
     def on_resize(e):
-        print(f"Resized to: {page.window.width}x{page.window.height}")
-        page.update()
+        logger.debug("Resized to: %sx%s", page.window.width, page.window.height)
+        # Resize events arrive in bursts; repaint at most once a frame
+        updates.request()
 
     page.on_route_change = change_route
     page.on_view_pop = lambda e: page.go(page.views[-1].route) if len(page.views) > 1 else None
     page.on_resize = on_resize
 
+    def dispose_views(e):
+        for view in views.values():
+            content = view.controls[0]
+            content.page = page
+            content.dispose()
+        views.clear()
+
+    page.on_close = dispose_views
+
     page.go("/")
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""One-off migration of the sync server's MySQL database to the schema the app's sync needs.
+
+Run it once per server before clients of this version sync:
+
+    ASSET_SYNC_USER=... ASSET_SYNC_PASSWORD=... python migrate_server.py
+
+It connects with the app's settings (sync.defaults.ini, sync.ini and ASSET_SYNC_* variables) and
+needs a user allowed to ALTER and CREATE tables. Running it again only adds what is still missing.
+"""
+import logging
+from sync_connection import SyncConnectionManager
+from sync_server import ATTACHMENT_TABLES, SYNC_TABLES, check_server_schema
+
+logger = logging.getLogger(__name__)
+
+def migrate_server(cursor):
+    """Add the change-tracking and digest columns and the chunk staging table if missing."""
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME IN ('updated_at', 'image_sha256', 'bill_sha256')
+    """)
+    existing = set(cursor.fetchall())
+    for table in SYNC_TABLES:
+        if (table, "updated_at") not in existing:
+            logger.info("Adding %s.updated_at", table)
+            cursor.execute(f"""
+                ALTER TABLE {table}
+                ADD COLUMN updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                ADD INDEX idx_{table}_updated_at (updated_at, id)
+            """)
+    for table, (_, data_column, digest_column) in ATTACHMENT_TABLES.items():
+        if (table, digest_column) not in existing:
+            logger.info("Adding %s.%s and filling it in", table, digest_column)
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {digest_column} CHAR(64), ADD INDEX idx_{digest_column} ({digest_column})")
+            cursor.execute(f"UPDATE {table} SET {digest_column} = SHA2({data_column}, 256) WHERE {data_column} IS NOT NULL")
+    # Staging area for chunked uploads, keyed by content digest and byte offset
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attachment_chunks (
+            sha256 CHAR(64) NOT NULL,
+            chunk_offset BIGINT NOT NULL,
+            data MEDIUMBLOB NOT NULL,
+            uploaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (sha256, chunk_offset)
+        )
+    """)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    connections = SyncConnectionManager()
+    conn = connections.acquire()
+    try:
+        cursor = conn.cursor()
+        migrate_server(cursor)
+        conn.commit()
+        # The same check clients make before every sync
+        check_server_schema(cursor)
+        cursor.close()
+    finally:
+        connections.release(conn)
+    logger.info("Server schema is up to date.")
+
+if __name__ == "__main__":
+    main()
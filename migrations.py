@@ -0,0 +1,194 @@
+import sqlite3
+from sync_server import ATTACHMENT_TABLES, queue_all_for_upload, store_attachment
+
+# Asset columns covered by the assets_fts full-text index
+SEARCH_COLUMNS = ("model", "serial_number", "company", "location", "status")
+
+# Local schema changes in order; PRAGMA user_version records how many have been applied.
+# Databases from before versioning start at 0, so every step must cope with a schema
+# that is already partly there. Append new steps, never edit or reorder applied ones.
+
+def _create_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS assets (
+            id INTEGER PRIMARY KEY,
+            model TEXT,
+            serial_number TEXT UNIQUE,
+            company TEXT,
+            location TEXT,
+            purchase_date TEXT,
+            status TEXT,
+            last_sync TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS asset_images (
+            id INTEGER PRIMARY KEY,
+            asset_id INTEGER,
+            image_name TEXT,
+            image_data BLOB,
+            last_sync TEXT,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS asset_bills (
+            id INTEGER PRIMARY KEY,
+            asset_id INTEGER,
+            bill_name TEXT,
+            bill_data BLOB,
+            last_sync TEXT,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """)
+
+def _create_sync_tables(cursor):
+    # High-water mark (server updated_at, id) of the last pulled row per table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            table_name TEXT PRIMARY KEY,
+            watermark TEXT,
+            watermark_id INTEGER
+        )
+    """)
+    # Rows edited locally and not yet uploaded; one entry per row, re-queued edits get a new seq
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_outbox'")
+    outbox_exists = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_outbox (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            queued_at TEXT,
+            UNIQUE (table_name, row_id)
+        )
+    """)
+    if not outbox_exists:
+        # Rows written before the outbox existed have never been tracked, so upload them once
+        queue_all_for_upload(cursor)
+
+def _move_attachments_to_blob_store(cursor):
+    # Attachment bytes live in the on-disk blob store; the tables only hold their SHA-256 digest
+    moved = False
+    for table, (_, data_column, digest_column) in ATTACHMENT_TABLES.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        if digest_column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {digest_column} TEXT")
+        # Move BLOBs still stored inline into the blob store
+        cursor.execute(f"SELECT id FROM {table} WHERE {data_column} IS NOT NULL")
+        for (row_id,) in cursor.fetchall():
+            cursor.execute(f"SELECT {data_column} FROM {table} WHERE id = ?", (row_id,))
+            digest = store_attachment(cursor.fetchone()[0])
+            cursor.execute(f"UPDATE {table} SET {digest_column} = ?, {data_column} = NULL WHERE id = ?", (digest, row_id))
+            moved = True
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attachment_blobs'")
+    if cursor.fetchone():
+        # Earlier versions kept deduplicated bytes in an attachment_blobs table
+        cursor.execute("SELECT sha256 FROM attachment_blobs")
+        for (digest,) in cursor.fetchall():
+            cursor.execute("SELECT data FROM attachment_blobs WHERE sha256 = ?", (digest,))
+            store_attachment(cursor.fetchone()[0])
+        cursor.execute("DROP TABLE attachment_blobs")
+        moved = True
+    # Give the pages freed by the moved BLOBs back to the file system
+    return moved
+
+def _add_lookup_indexes(cursor):
+    # Saves and syncs find attachments by asset_id, or by asset_id and file name
+    for table, (name_column, _, _) in ATTACHMENT_TABLES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_asset_name ON {table} (asset_id, {name_column})")
+    # Match the asset list's sort expressions so each keyset page is an index range scan
+    for column in ("model", "serial_number", "location"):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_assets_{column}_sort ON assets (COALESCE({column}, ''))")
+
+def _create_thumbnails(cursor):
+    # Small JPEG previews keyed by the SHA-256 digest of the original image
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            sha256 TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    """)
+
+def _create_search_index(cursor):
+    # The trigram tokenizer (SQLite 3.34+) matches any fragment of a serial number; older
+    # SQLite falls back to word tokens, and builds without FTS5 search with LIKE instead
+    columns = ", ".join(SEARCH_COLUMNS)
+    for tokenize in ("trigram", "unicode61"):
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS assets_fts USING fts5(
+                    {columns}, content='assets', content_rowid='id', tokenize='{tokenize}'
+                )
+            """)
+            break
+        except sqlite3.OperationalError:
+            continue
+    else:
+        return
+    new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+    # External-content index: the triggers keep it in step with every write to assets
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS assets_fts_insert AFTER INSERT ON assets BEGIN
+            INSERT INTO assets_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS assets_fts_delete AFTER DELETE ON assets BEGIN
+            INSERT INTO assets_fts (assets_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS assets_fts_update AFTER UPDATE OF {columns} ON assets BEGIN
+            INSERT INTO assets_fts (assets_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO assets_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    cursor.execute("INSERT INTO assets_fts (assets_fts) VALUES ('rebuild')")
+
+def _add_attachment_server_ids(cursor):
+    # Id of the server row an attachment row was pulled from or pushed to, so a renamed
+    # attachment updates that row instead of being matched by its new name
+    for table in ATTACHMENT_TABLES:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if "server_id" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN server_id INTEGER")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_server_id ON {table} (server_id)")
+    # Re-read the attachment metadata once to link the rows already pulled; their content is
+    # in the blob store and is not downloaded again
+    cursor.execute(
+        f"DELETE FROM sync_state WHERE table_name IN ({', '.join('?' * len(ATTACHMENT_TABLES))})", tuple(ATTACHMENT_TABLES)
+    )
+
+MIGRATIONS = [
+    _create_tables,
+    _create_sync_tables,
+    _move_attachments_to_blob_store,
+    _add_lookup_indexes,
+    _create_thumbnails,
+    _create_search_index,
+    _add_attachment_server_ids,
+]
+
+def migrate(local_db):
+    """Apply the pending MIGRATIONS, each in its own transaction; a no-op once the database is current."""
+    version = local_db.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    vacuum = False
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor = local_db.cursor()
+        try:
+            cursor.execute("BEGIN")
+            # A migration returns True when it freed enough space to be worth a VACUUM
+            vacuum = migration(cursor) or vacuum
+            cursor.execute(f"PRAGMA user_version = {number}")
+            local_db.commit()
+        except Exception:
+            local_db.rollback()
+            raise
+        finally:
+            cursor.close()
+    if vacuum:
+        local_db.execute("VACUUM")
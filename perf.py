@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class Trace:
+    """Phase timings and counters of one operation, e.g. a sync, cheap enough to leave always on.
+
+    Phases may overlap (a sync reads and writes at the same time), so their total can exceed
+    the elapsed time; each phase keeps how often it ran and its summed seconds.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.phases = {}
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._elapsed = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                totals = self.phases.setdefault(name, [0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s: %s took %.1f ms", self.name, name, seconds * 1000)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stop(self):
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._start
+
+    @property
+    def elapsed(self):
+        return self._elapsed if self._elapsed is not None else time.perf_counter() - self._start
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "elapsed_s": round(self.elapsed, 4),
+                "phases": {
+                    name: {"count": count, "seconds": round(seconds, 4)} for name, (count, seconds) in self.phases.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def summary(self, slowest=3):
+        """One line: elapsed time, the slowest phases and the counters."""
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1][1], reverse=True)[:slowest]
+            parts = [f"{name} {seconds:.1f} s" for name, (_, seconds) in phases]
+            parts += [f"{count} {name}" for name, count in self.counters.items()]
+        return f"Took {self.elapsed:.1f} s" + (f" ({', '.join(parts)})" if parts else "")
+
+class CountingCursor:
+    """Wraps a DB-API cursor and counts the statements run through it in trace."""
+
+    def __init__(self, cursor, trace, counter):
+        self._cursor = cursor
+        self._trace = trace
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._trace.count(self._counter)
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._trace.count(self._counter)
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+def export_trace(data, directory, prefix):
+    """Write data as JSON to a new timestamped file under directory and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+# Timings and page.update() counts of the UI thread for the whole session
+ui_trace = Trace("ui")
+
+def instrument_page(page):
+    """Count every page.update() in ui_trace."""
+    update = page.update
+
+    def counted_update(*controls):
+        ui_trace.count("page updates")
+        return update(*controls)
+
+    page.update = counted_update
+    return page
@@ -0,0 +1,251 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from migrations import SEARCH_COLUMNS, migrate
+from sync_server import LOCAL_DB_PATH, queue_for_upload
+
+# Applied to every local connection: WAL lets the sync worker write while pages read,
+# NORMAL sync is durable in WAL mode, and reads are served from mmap and a larger page cache
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 67108864",
+    "PRAGMA cache_size = -8192",
+)
+STATEMENT_CACHE_SIZE = 128
+
+# Sort choice -> SQL sort expression; every page is ordered by (expression, id)
+SORT_OPTIONS = {
+    "Date Added": "id",
+    "Model": "COALESCE(model, '')",
+    "Serial Number": "COALESCE(serial_number, '')",
+    "Location": "COALESCE(location, '')",
+}
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def configure_connection(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def connect(db_path=LOCAL_DB_PATH, **kwargs):
+    """Open a local database connection with the shared pragmas applied."""
+    return configure_connection(sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, **kwargs))
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+class AssetRepository:
+    """The UI's single connection to the local database; pending schema migrations run once when it opens."""
+
+    def __init__(self, db_path=LOCAL_DB_PATH):
+        self.db_path = db_path
+        # Flet runs event handlers on worker threads, so the connection is shared behind a lock
+        self.lock = threading.RLock()
+        self.conn = connect(db_path, check_same_thread=False)
+        migrate(self.conn)
+        # Asset edits saved through this repository; see data_version()
+        self.local_changes = 0
+        # Tokenizer of the assets_fts index, or None when this SQLite build has no FTS5
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'assets_fts'").fetchone()
+        self.search_tokenizer = None if row is None else "trigram" if "trigram" in row[0] else "unicode61"
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                # Take the write lock up front: a deferred transaction that reads before it writes
+                # cannot wait on busy_timeout to upgrade under WAL and fails with "database is locked"
+                cursor.execute("BEGIN IMMEDIATE")
+                yield cursor
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _query(self, sql, params=(), one=False):
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            try:
+                return cursor.fetchone() if one else cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def data_version(self):
+        """A value that changes whenever assets are edited here or another connection (the sync worker) commits."""
+        with self.lock:
+            return self.local_changes, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _list_conditions(self, status):
+        if status and status != "All":
+            return ["assets.status = ?"], [status]
+        return [], []
+
+    def list_assets(self, sort_by, status, after=None, limit=50):
+        """(id, model, serial_number, location, sort value) rows after the (sort value, id) keyset position."""
+        sort_expression = SORT_OPTIONS[sort_by]
+        conditions, params = self._list_conditions(status)
+        if after is not None:
+            conditions.append(f"({sort_expression}, id) > (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"""
+            SELECT id, model, serial_number, location, {sort_expression} FROM assets
+            {where} ORDER BY {sort_expression}, id LIMIT ?
+        """, (*params, limit))
+
+    def get_list_row(self, asset_id, sort_by, status):
+        """One list_assets row for asset_id, or None if it is gone or hidden by the status filter."""
+        sort_expression = SORT_OPTIONS[sort_by]
+        conditions, params = self._list_conditions(status)
+        conditions.append("id = ?")
+        return self._query(f"""
+            SELECT id, model, serial_number, location, {sort_expression} FROM assets
+            WHERE {' AND '.join(conditions)}
+        """, (*params, asset_id), one=True)
+
+    def search_assets(self, text, status, limit=50):
+        """(id, model, serial_number, location, rank) rows matching every word of text, best match first.
+
+        Words match anywhere in a column with the trigram index, or as word prefixes with the fallback one.
+        """
+        phrases = []
+        like_words = []
+        for word in text.split():
+            if self.search_tokenizer == "unicode61":
+                phrases.append('"{}"*'.format(word.replace('"', '""')))
+            elif self.search_tokenizer == "trigram" and len(word) >= 3:
+                phrases.append('"{}"'.format(word.replace('"', '""')))
+            else:
+                # Trigrams need three characters; shorter words are matched with LIKE
+                like_words.append(word)
+        if not phrases and not like_words:
+            return []
+        conditions, params = self._list_conditions(status)
+        for word in like_words:
+            pattern = "%{}%".format(word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+            conditions.append("(" + " OR ".join(f"assets.{column} LIKE ? ESCAPE '\\'" for column in SEARCH_COLUMNS) + ")")
+            params.extend([pattern] * len(SEARCH_COLUMNS))
+        if phrases:
+            conditions.append("assets_fts MATCH ?")
+            params.append(" ".join(phrases))
+            sql = """
+                SELECT assets.id, assets.model, assets.serial_number, assets.location, assets_fts.rank
+                FROM assets_fts JOIN assets ON assets.id = assets_fts.rowid
+                WHERE {} ORDER BY assets_fts.rank LIMIT ?
+            """
+        else:
+            sql = "SELECT id, model, serial_number, location, id FROM assets WHERE {} ORDER BY id LIMIT ?"
+        return self._query(sql.format(" AND ".join(conditions)), (*params, limit))
+
+    def get_edit_details(self, asset_id):
+        """(model, serial_number, location, digest of the first image or None) of an asset, or None."""
+        return self._query("""
+            SELECT model, serial_number, location,
+                (SELECT image_sha256 FROM asset_images WHERE asset_id = assets.id ORDER BY id LIMIT 1)
+            FROM assets WHERE id = ?
+        """, (asset_id,), one=True)
+
+    def get_image_digests(self, asset_ids):
+        """{asset id: digest of its first image} for those of asset_ids that have images."""
+        if not asset_ids:
+            return {}
+        placeholders = ", ".join("?" * len(asset_ids))
+        return dict(self._query(f"""
+            SELECT asset_id, image_sha256 FROM asset_images WHERE id IN (
+                SELECT MIN(id) FROM asset_images WHERE asset_id IN ({placeholders}) GROUP BY asset_id
+            )
+        """, asset_ids))
+
+    def get_thumbnail(self, digest):
+        row = self._query("SELECT data FROM thumbnails WHERE sha256 = ?", (digest,), one=True)
+        return row[0] if row else None
+
+    def save_thumbnail(self, digest, data):
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO thumbnails (sha256, data) VALUES (?, ?)", (digest, data))
+
+    def save_asset(self, model, serial_number, company, location, purchase_date, status, images=(), bills=()):
+        """Insert or update the asset with this serial number and its attachments; returns the asset id.
+
+        images and bills are (name, digest) pairs; an attachment with the same name is replaced.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT id FROM assets WHERE serial_number = ?", (serial_number,))
+            existing_asset = cursor.fetchone()
+            if existing_asset:
+                asset_id = existing_asset[0]
+                cursor.execute("""
+                    UPDATE assets SET model = ?, company = ?, location = ?, purchase_date = ?, status = ?, last_sync = ?
+                    WHERE id = ?
+                """, (model, company, location, purchase_date, status, _now(), asset_id))
+            else:
+                cursor.execute("""
+                    INSERT INTO assets (model, serial_number, company, location, purchase_date, status, last_sync)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (model, serial_number, company, location, purchase_date, status, _now()))
+                asset_id = cursor.lastrowid
+            queue_for_upload(cursor, "assets", asset_id)
+            self._save_attachments(cursor, "asset_images", "image_name", "image_sha256", asset_id, images)
+            self._save_attachments(cursor, "asset_bills", "bill_name", "bill_sha256", asset_id, bills)
+            self.local_changes += 1
+        return asset_id
+
+    def _save_attachments(self, cursor, table, name_column, digest_column, asset_id, attachments):
+        if not attachments:
+            return
+        cursor.execute(f"SELECT {name_column}, id FROM {table} WHERE asset_id = ?", (asset_id,))
+        existing = dict(cursor.fetchall())
+        for name, digest in attachments:
+            if name in existing:
+                cursor.execute(
+                    f"UPDATE {table} SET {digest_column} = ?, last_sync = ? WHERE id = ?", (digest, _now(), existing[name])
+                )
+                queue_for_upload(cursor, table, existing[name])
+            else:
+                cursor.execute(
+                    f"INSERT INTO {table} (asset_id, {name_column}, {digest_column}, last_sync) VALUES (?, ?, ?, ?)",
+                    (asset_id, name, digest, _now()),
+                )
+                queue_for_upload(cursor, table, cursor.lastrowid)
+
+    def update_asset(self, asset_id, location, image=None, bill=None):
+        """Change an asset's location and replace its first image and bill with (name, digest) pairs."""
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE assets SET location = ? WHERE id = ?", (location, asset_id))
+            queue_for_upload(cursor, "assets", asset_id)
+            if image:
+                self._replace_attachment(cursor, "asset_images", "image_name", "image_sha256", asset_id, image)
+            if bill:
+                self._replace_attachment(cursor, "asset_bills", "bill_name", "bill_sha256", asset_id, bill)
+            self.local_changes += 1
+
+    def _replace_attachment(self, cursor, table, name_column, digest_column, asset_id, attachment):
+        name, digest = attachment
+        cursor.execute(f"SELECT id FROM {table} WHERE asset_id = ? LIMIT 1", (asset_id,))
+        existing = cursor.fetchone()
+        if existing:
+            cursor.execute(
+                f"UPDATE {table} SET {digest_column} = ?, {name_column} = ?, last_sync = ? WHERE id = ?",
+                (digest, name, _now(), existing[0]),
+            )
+            queue_for_upload(cursor, table, existing[0])
+        else:
+            cursor.execute(
+                f"INSERT INTO {table} (asset_id, {name_column}, {digest_column}, last_sync) VALUES (?, ?, ?, ?)",
+                (asset_id, name, digest, _now()),
+            )
+            queue_for_upload(cursor, table, cursor.lastrowid)
+
+def get_repository():
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = AssetRepository()
+        return _repository
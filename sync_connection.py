@@ -0,0 +1,96 @@
+import configparser
+import os
+import threading
+import time
+
+# Tracked defaults without credentials, then the local, untracked file that adds them
+DEFAULTS_PATH = "sync.defaults.ini"
+CONFIG_PATH = "sync.ini"
+ENV_PREFIX = "ASSET_SYNC_"
+
+# Every key can be set in the [server] section of the config files or overridden by
+# an ASSET_SYNC_<KEY> environment variable; ASSET_SYNC_CONFIG points at another local file.
+DEFAULT_CONFIG = {
+    "host": "localhost",
+    "port": "3306",
+    "user": "",
+    "password": "",
+    "database": "asm_sys",
+    "pool_size": "3",
+    "idle_timeout": "300",
+    "connect_timeout": "10",
+    "memory_limit_mb": "8",
+    "trace_dir": "",
+}
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def load_sync_config(path=None):
+    parser = configparser.ConfigParser()
+    parser.read([DEFAULTS_PATH, path or os.environ.get(ENV_PREFIX + "CONFIG", CONFIG_PATH)])
+    section = parser["server"] if parser.has_section("server") else {}
+    return {
+        key: os.environ.get(ENV_PREFIX + key.upper(), section.get(key, default))
+        for key, default in DEFAULT_CONFIG.items()
+    }
+
+class SyncConnectionManager:
+    """Pool of MySQL connections reused across syncs, health-checked on every checkout."""
+
+    def __init__(self, config=None):
+        config = config or load_sync_config()
+        self.pool_size = int(config["pool_size"])
+        self.idle_timeout = float(config["idle_timeout"])
+        self._connect_args = {
+            "host": config["host"],
+            "port": int(config["port"]),
+            "user": config["user"],
+            "password": config["password"],
+            "database": config["database"],
+            "connection_timeout": int(config["connect_timeout"]),
+        }
+        self._pool = None
+        self._lock = threading.Lock()
+        self._released_at = {}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Imported on the first sync rather than at app start
+                from mysql.connector import Error, pooling
+                if not self._connect_args["user"]:
+                    raise Error(msg=(
+                        f"no sync server user is configured; set {ENV_PREFIX}USER and {ENV_PREFIX}PASSWORD "
+                        f"or add user and password to {CONFIG_PATH}"
+                    ))
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name="asset_sync", pool_size=self.pool_size, pool_reset_session=True, **self._connect_args
+                )
+            return self._pool
+
+    def acquire(self):
+        conn = self._get_pool().get_connection()
+        try:
+            idle = time.monotonic() - self._released_at.get(id(conn._cnx), time.monotonic())
+            if idle > self.idle_timeout:
+                # The server may have dropped a connection idle this long; start a fresh session
+                conn.reconnect(attempts=2, delay=1)
+            else:
+                conn.ping(reconnect=True, attempts=2, delay=1)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def release(self, conn):
+        self._released_at[id(conn._cnx)] = time.monotonic()
+        # Closing a pooled connection hands it back to the pool instead of disconnecting
+        conn.close()
+
+def get_connection_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SyncConnectionManager()
+        return _manager
@@ -1,196 +1,1070 @@
-import mysql.connector
 import flet as ft
-from mysql.connector import Error
+import queue
 import sqlite3
+import threading
 import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from blobstore import get_blob_store
+from perf import CountingCursor, Trace
+from sync_connection import get_connection_manager, load_sync_config
 
-def initialize_local_db(local_db):
-    cursor = local_db.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS assets (
-            id INTEGER PRIMARY KEY,
-            model TEXT,
-            serial_number TEXT UNIQUE,
-            company TEXT,
-            location TEXT,
-            purchase_date TEXT,
-            status TEXT,
-            last_sync TEXT
+SYNC_TABLES = ("assets", "asset_images", "asset_bills")
+# Attachment table -> (name column, inline data column, SHA-256 digest column)
+ATTACHMENT_TABLES = {
+    "asset_images": ("image_name", "image_data", "image_sha256"),
+    "asset_bills": ("bill_name", "bill_data", "bill_sha256"),
+}
+SQLITE_MAX_PARAMS = 500
+LOCAL_DB_PATH = "assets.db"
+# Attachments larger than this travel in chunks of this size, each acknowledged on its own,
+# so an interrupted transfer resumes from the last completed chunk
+CHUNK_SIZE = 512 * 1024
+# Upload chunks of attachments that never finished syncing are dropped after this many days
+CHUNK_RETENTION_DAYS = 7
+# Server rows pulled and committed locally per batch, together with their watermark
+PULL_BATCH = 500
+# Batches the server readers may fetch ahead of the local writer
+PIPELINE_DEPTH = 4
+# updated_at is stamped when a statement runs, not when its transaction commits, so a push
+# still running elsewhere can commit rows behind a watermark this client already stored.
+# A pull re-reads this many seconds behind the stored watermark to pick them up.
+WATERMARK_OVERLAP = 600
+WATERMARK_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+SyncResult = namedtuple("SyncResult", "ok message progress")
+
+_server_schema_ready = False
+
+class SyncCancelled(Exception):
+    pass
+
+class SyncProgress:
+    """Running row/byte counts per table, reported to an optional callback, plus the cancellation flag.
+
+    trace records where the time went: phase timings and server/local statement counts.
+    """
+
+    def __init__(self, callback=None, cancel_event=None, name="sync"):
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.tables = {}
+        self.trace = Trace(name)
+        # A pull reports from its reader threads and its writer at the same time
+        self._lock = threading.RLock()
+
+    def add(self, table, rows=0, nbytes=0):
+        with self._lock:
+            counts = self.tables.setdefault(table, [0, 0])
+            counts[0] += rows
+            counts[1] += nbytes
+            if self.callback:
+                self.callback(self)
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise SyncCancelled()
+
+    def summary(self):
+        with self._lock:
+            if not self.tables:
+                return "Nothing to transfer."
+            return "\n".join(
+                f"{table}: {rows} rows, {nbytes / 1024:.1f} KB" for table, (rows, nbytes) in self.tables.items()
+            )
+
+    def to_dict(self):
+        with self._lock:
+            tables = {table: {"rows": rows, "bytes": nbytes} for table, (rows, nbytes) in self.tables.items()}
+        return {**self.trace.to_dict(), "tables": tables}
+
+def store_attachment(data):
+    """Store attachment bytes in the blob store and return their SHA-256 digest."""
+    return get_blob_store().put(data)
+
+def load_attachment(digest):
+    return get_blob_store().read(digest)
+
+def queue_for_upload(cursor, table, row_id):
+    """Record a locally written row in the outbox so the next sync_to_server uploads it."""
+    cursor.execute(
+        "INSERT OR REPLACE INTO sync_outbox (table_name, row_id, queued_at) VALUES (?, ?, ?)",
+        (table, row_id, time.strftime("%Y-%m-%d %H:%M:%S")),
+    )
+
+def queue_all_for_upload(cursor):
+    """Queue every local row for upload, e.g. before a full sync_to_server."""
+    queued_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    for table in SYNC_TABLES:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO sync_outbox (table_name, row_id, queued_at) SELECT ?, id, ? FROM {table}",
+            (table, queued_at),
         )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS asset_images (
-            id INTEGER PRIMARY KEY,
-            asset_id INTEGER,
-            image_name TEXT,
-            image_data BLOB,
-            last_sync TEXT,
-            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+
+def server_schema_columns():
+    """(table, column) pairs the sync needs on the server; migrate_server.py adds them."""
+    columns = {(table, "updated_at") for table in SYNC_TABLES}
+    columns.update((table, digest_column) for table, (_, _, digest_column) in ATTACHMENT_TABLES.items())
+    # Staging area for chunked uploads
+    columns.add(("attachment_chunks", "sha256"))
+    return columns
+
+def check_server_schema(cursor):
+    """Raise an Error naming migrate_server.py if the server lacks columns the sync relies on.
+
+    Clients never change the server schema themselves; it is migrated once by an administrator.
+    """
+    global _server_schema_ready
+    if _server_schema_ready:
+        return
+    from mysql.connector import Error
+    required = server_schema_columns()
+    names = sorted({column for _, column in required})
+    cursor.execute(f"""
+        SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME IN ({_placeholders(names, '%s')})
+    """, names)
+    missing = required - set(cursor.fetchall())
+    if missing:
+        raise Error(msg=(
+            f"the server database is missing {', '.join(sorted(f'{table}.{column}' for table, column in missing))}; "
+            "run migrate_server.py against it once"
+        ))
+    _server_schema_ready = True
+
+def _chunks(values, size=SQLITE_MAX_PARAMS):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _placeholders(values, marker="?"):
+    return ", ".join([marker] * len(values))
+
+def _chunk_size(max_bytes):
+    return min(CHUNK_SIZE, max_bytes)
+
+def _load_watermark(local_cursor, table):
+    local_cursor.execute("SELECT watermark, watermark_id FROM sync_state WHERE table_name = ?", (table,))
+    return local_cursor.fetchone()
+
+def _position(row):
+    """(updated_at, id) of a pulled row, comparable with a stored watermark."""
+    return row[-1].strftime(WATERMARK_FORMAT), row[0]
+
+def _overlap_start(watermark):
+    """Where a pull resumes: WATERMARK_OVERLAP seconds behind the stored watermark."""
+    if watermark is None:
+        return None
+    start = datetime.strptime(watermark[0], WATERMARK_FORMAT) - timedelta(seconds=WATERMARK_OVERLAP)
+    return start.strftime(WATERMARK_FORMAT), 0
+
+def _save_watermark(local_cursor, table, rows):
+    if not rows:
+        return
+    # Rows re-read from the overlap window never move the watermark back
+    local_cursor.execute("""
+        INSERT INTO sync_state (table_name, watermark, watermark_id) VALUES (?, ?, ?)
+        ON CONFLICT(table_name) DO UPDATE SET watermark = excluded.watermark, watermark_id = excluded.watermark_id
+        WHERE (excluded.watermark, excluded.watermark_id) > (sync_state.watermark, sync_state.watermark_id)
+    """, (table, *_position(rows[-1])))
+
+def _queued_ids(local_cursor, table, ids):
+    """Those of ids with local changes still waiting in the outbox."""
+    queued = set()
+    for chunk in _chunks(ids):
+        local_cursor.execute(
+            f"SELECT row_id FROM sync_outbox WHERE table_name = ? AND row_id IN ({_placeholders(chunk)})", (table, *chunk)
         )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS asset_bills (
-            id INTEGER PRIMARY KEY,
-            asset_id INTEGER,
-            bill_name TEXT,
-            bill_data BLOB,
-            last_sync TEXT,
-            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        queued.update(row[0] for row in local_cursor.fetchall())
+    return queued
+
+def _fetch_changed(cursor, table, columns, after):
+    """Fetch up to PULL_BATCH server rows changed after the (updated_at, id) position, in that order."""
+    sql = f"SELECT {', '.join(columns)}, updated_at FROM {table}"
+    params = ()
+    if after:
+        sql += " WHERE updated_at > %s OR (updated_at = %s AND id > %s)"
+        params = (after[0], after[0], after[1])
+    cursor.execute(sql + " ORDER BY updated_at, id LIMIT %s", (*params, PULL_BATCH))
+    return cursor.fetchall()
+
+def _changed_batches(cursor, table, columns, after, progress):
+    """Yield a table's server rows changed after the (updated_at, id) position in PULL_BATCH batches."""
+    while True:
+        progress.check_cancelled()
+        rows = _fetch_changed(cursor, table, columns, after)
+        if rows:
+            yield rows
+        if len(rows) < PULL_BATCH:
+            return
+        after = (rows[-1][-1], rows[-1][0])
+
+def _local_asset_ids(local_cursor, serial_numbers):
+    local_ids = {}
+    for chunk in _chunks(serial_numbers):
+        local_cursor.execute(f"SELECT serial_number, id FROM assets WHERE serial_number IN ({_placeholders(chunk)})", chunk)
+        local_ids.update(local_cursor.fetchall())
+    return local_ids
+
+def _taken_ids(local_cursor, table, ids):
+    taken = set()
+    for chunk in _chunks(ids):
+        local_cursor.execute(f"SELECT id FROM {table} WHERE id IN ({_placeholders(chunk)})", chunk)
+        taken.update(row[0] for row in local_cursor.fetchall())
+    return taken
+
+ASSET_PULL_COLUMNS = ("id", "model", "serial_number", "company", "location", "purchase_date", "status")
+
+def _write_assets(local_cursor, mysql_assets, watermark, synced_at, progress):
+    serial_numbers = [row[2] for row in mysql_assets]
+    local_ids = _local_asset_ids(local_cursor, serial_numbers)
+    taken_ids = _taken_ids(local_cursor, "assets", [row[0] for row in mysql_assets])
+    queued = _queued_ids(local_cursor, "assets", local_ids.values())
+    rows = []
+    for mysql_id, model, serial_number, company, location, purchase_date, status, updated_at in mysql_assets:
+        # Local assets are matched by serial number, and ON CONFLICT never matches NULL, so a
+        # server asset without one would be inserted again by every pull that reads it
+        if serial_number is None:
+            continue
+        # A row re-read from the overlap window was most likely applied already; an edit made
+        # here since then must not be reverted by it before it is pushed
+        if local_ids.get(serial_number) in queued and watermark and _position((mysql_id, updated_at)) <= tuple(watermark):
+            continue
+        # Keep the server id for new assets unless a local-only asset already holds it
+        new_id = None
+        if serial_number not in local_ids and mysql_id not in taken_ids:
+            new_id = mysql_id
+            taken_ids.add(mysql_id)
+        rows.append((new_id, model, serial_number, company, location, purchase_date, status, synced_at))
+
+    # Rows keeping their server id go first, so an id SQLite assigns can never be one of theirs
+    rows.sort(key=lambda row: row[0] is None)
+    local_cursor.executemany("""
+        INSERT INTO assets (id, model, serial_number, company, location, purchase_date, status, last_sync)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(serial_number) DO UPDATE SET
+            model = excluded.model, company = excluded.company, location = excluded.location,
+            purchase_date = excluded.purchase_date, status = excluded.status, last_sync = excluded.last_sync
+    """, rows)
+    progress.add("assets", rows=len(mysql_assets), nbytes=sum(_row_size(row) for row in mysql_assets))
+
+def _server_serials(cursor, mysql_asset_ids):
+    """{server asset id: serial number}; attachments are matched to local assets through the serial number."""
+    serials = {}
+    for chunk in _chunks(set(mysql_asset_ids)):
+        cursor.execute(f"SELECT id, serial_number FROM assets WHERE id IN ({_placeholders(chunk, '%s')})", chunk)
+        serials.update(cursor.fetchall())
+    return serials
+
+def _download_attachments(cursor, table, fetch_ids, max_bytes, progress):
+    """Download the content of server rows {id: digest or None} into the blob store; returns {id: digest}.
+
+    Content up to the chunk size is fetched a packet-sized group of rows at a time. Larger content
+    is fetched chunk by chunk into a partial file, which a later pull resumes when the digest is known.
+    """
+    from mysql.connector import Error
+    _, data_column, _ = ATTACHMENT_TABLES[table]
+    store = get_blob_store()
+    # max_bytes is within the memory ceiling, and rows are streamed into the blob store one at a time
+    chunk_size = _chunk_size(max_bytes)
+    sizes = {}
+    for chunk in _chunks(fetch_ids):
+        cursor.execute(f"SELECT id, LENGTH({data_column}) FROM {table} WHERE id IN ({_placeholders(chunk, '%s')})", chunk)
+        sizes.update((row_id, size) for row_id, size in cursor.fetchall() if size is not None)
+
+    digests = {}
+    group = []
+    group_size = 0
+    whole = [row_id for row_id, size in sizes.items() if size <= chunk_size]
+    for position, row_id in enumerate(whole):
+        group.append(row_id)
+        group_size += sizes[row_id]
+        if position + 1 < len(whole) and group_size + sizes[whole[position + 1]] <= max_bytes and len(group) < SQLITE_MAX_PARAMS:
+            continue
+        progress.check_cancelled()
+        cursor.execute(f"SELECT id, {data_column} FROM {table} WHERE id IN ({_placeholders(group, '%s')})", group)
+        for row_id, data in cursor:
+            digests[row_id] = store_attachment(data)
+            progress.add(table, nbytes=len(data))
+        group = []
+        group_size = 0
+
+    for row_id, size in sizes.items():
+        if size <= chunk_size:
+            continue
+        # Partial files are kept per table, since the tables are downloaded by concurrent readers
+        digest = fetch_ids[row_id]
+        if digest is None:
+            # Without a digest a leftover partial file may hold other content, so start over
+            partial = f"{table}-{row_id}"
+            store.discard_partial(partial)
+        else:
+            partial = f"{table}-{digest}"
+        offset = store.partial_size(partial)
+        if offset > size:
+            store.discard_partial(partial)
+            offset = 0
+        while offset < size:
+            progress.check_cancelled()
+            cursor.execute(
+                f"SELECT SUBSTRING({data_column}, %s, %s) FROM {table} WHERE id = %s", (offset + 1, chunk_size, row_id)
+            )
+            data = cursor.fetchone()[0]
+            if not data:
+                # The server row shrank since its size was read; the next pull starts it over
+                store.discard_partial(partial)
+                raise Error(msg=f"{table} row {row_id} changed during download")
+            store.append_partial(partial, offset, data)
+            offset += len(data)
+            progress.add(table, nbytes=len(data))
+        digests[row_id] = store.finish_partial(partial)
+    return digests
+
+def _attachment_batches(cursor, table, after, max_bytes, downloads, progress):
+    """Yield (rows, {server asset id: serial number}, {row id: digest}) per batch of changed attachment rows.
+
+    The rows hold metadata only; content the blob store does not hold yet is downloaded into it
+    before the batch is yielded, so the writer never waits on the network for it. Content another
+    reader is already downloading is waited for instead of fetched again.
+    """
+    name_column, _, digest_column = ATTACHMENT_TABLES[table]
+    store = get_blob_store()
+    for mysql_rows in _changed_batches(cursor, table, ("id", "asset_id", name_column, digest_column), after, progress):
+        digests = {}
+        fetch_ids = {}
+        for row_id, _, _, digest, _ in mysql_rows:
+            if digest is None:
+                fetch_ids[row_id] = None
+            elif digest not in fetch_ids.values():
+                fetch_ids[row_id] = digest
+            digests[row_id] = digest
+        with progress.trace.phase(f"download {table}"):
+            while fetch_ids:
+                missing = {digest for digest in fetch_ids.values() if digest and not store.exists(digest)}
+                mine, busy = downloads.claim(missing)
+                try:
+                    digests.update(_download_attachments(
+                        cursor, table, {row_id: digest for row_id, digest in fetch_ids.items() if digest is None or digest in mine},
+                        max_bytes, progress,
+                    ))
+                finally:
+                    downloads.release(mine)
+                # Content the other reader was fetching is checked again once it is done, in case it failed
+                fetch_ids = {row_id: digest for row_id, digest in fetch_ids.items() if digest in busy}
+                downloads.wait(busy.values(), progress)
+        yield mysql_rows, _server_serials(cursor, [row[1] for row in mysql_rows]), digests
+
+def _write_attachments(local_cursor, table, mysql_rows, serials, digests, watermark, synced_at, progress):
+    """Apply a batch of pulled attachment rows; returns the position in mysql_rows of the first row
+    that has to wait for its asset to be pulled, or None."""
+    name_column, _, digest_column = ATTACHMENT_TABLES[table]
+    # Map server asset ids to local ids through the serial number
+    local_ids = _local_asset_ids(local_cursor, serials.values())
+    asset_map = {mysql_id: local_ids[serial] for mysql_id, serial in serials.items() if serial in local_ids}
+
+    # Local rows are matched by the server row they came from or went to, and rows
+    # not linked to one yet by (asset, name)
+    by_server_id = {}
+    by_name = {}
+    for chunk in _chunks(set(asset_map.values())):
+        local_cursor.execute(
+            f"SELECT id, asset_id, {name_column}, {digest_column}, server_id FROM {table} "
+            f"WHERE asset_id IN ({_placeholders(chunk)})",
+            chunk,
         )
-    """)
-    local_db.commit()
+        for row_id, asset_id, name, digest, server_id in local_cursor.fetchall():
+            if server_id is None:
+                by_name[(asset_id, name)] = (row_id, name, digest, server_id)
+            else:
+                by_server_id[server_id] = (row_id, name, digest, server_id)
+    taken_ids = _taken_ids(local_cursor, table, [row[0] for row in mysql_rows])
+    queued = _queued_ids(local_cursor, table, [row[0] for row in (*by_server_id.values(), *by_name.values())])
+
+    updates = []
+    inserts = []
+    waiting = None
+    for position, (row_id, mysql_asset_id, name, _, updated_at) in enumerate(mysql_rows):
+        local_asset_id = asset_map.get(mysql_asset_id)
+        if local_asset_id is None:
+            # The asset was committed after the asset rows were read; rows of assets without
+            # a serial number can never be matched and are not waited for
+            if waiting is None and serials.get(mysql_asset_id) is not None:
+                waiting = position
+            continue
+        digest = digests[row_id]
+        local_row = by_server_id.get(row_id) or by_name.pop((local_asset_id, name), None)
+        if local_row is not None:
+            local_id = local_row[0]
+            replayed = watermark and _position((row_id, updated_at)) <= tuple(watermark)
+            if local_row[1:] != (name, digest, row_id) and not (replayed and local_id in queued):
+                updates.append((name, digest, row_id, synced_at, local_id))
+        else:
+            new_id = None if row_id in taken_ids else row_id
+            if new_id is not None:
+                taken_ids.add(new_id)
+            inserts.append((new_id, local_asset_id, name, digest, row_id, synced_at))
+
+    local_cursor.executemany(
+        f"UPDATE {table} SET {name_column} = ?, {digest_column} = ?, server_id = ?, last_sync = ? WHERE id = ?", updates
+    )
+    inserts.sort(key=lambda row: row[0] is None)
+    local_cursor.executemany(f"""
+        INSERT INTO {table} (id, asset_id, {name_column}, {digest_column}, server_id, last_sync)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, inserts)
+    progress.add(table, rows=len(mysql_rows))
+    return waiting
+
+# Marks the end of a table's batches on a pipeline queue
+_END = object()
+
+class _ReaderProgress:
+    """SyncProgress as seen by a reader thread, which also stops once the writer has given up."""
+
+    def __init__(self, progress, stop):
+        self.progress = progress
+        self.stop = stop
+        self.trace = progress.trace
+
+    def add(self, table, rows=0, nbytes=0):
+        self.progress.add(table, rows=rows, nbytes=nbytes)
+
+    def check_cancelled(self):
+        if self.stop.is_set():
+            raise SyncCancelled()
+        self.progress.check_cancelled()
+
+class _Downloads:
+    """Digests a pull's readers are downloading, so content the image and bill tables share is fetched once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def claim(self, digests):
+        """Returns (the digests now claimed by the caller, {digest: Event} of those another reader holds)."""
+        mine = set()
+        busy = {}
+        with self._lock:
+            for digest in digests:
+                if digest in self._active:
+                    busy[digest] = self._active[digest]
+                else:
+                    self._active[digest] = threading.Event()
+                    mine.add(digest)
+        return mine, busy
+
+    def release(self, digests):
+        with self._lock:
+            for digest in digests:
+                self._active.pop(digest).set()
+
+    def wait(self, events, progress):
+        for event in events:
+            while not event.wait(0.1):
+                progress.check_cancelled()
+
+def _hand_over(items, item, stop):
+    """Put item on a bounded pipeline queue; False if the writer stopped before taking it."""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _read_tables(connections, tables, starts, max_bytes, queues, downloads, stop, progress):
+    """Reader stage: queue the changed batches of each table in turn, read on a pooled connection of its own.
 
-def sync_from_server(local_db, page):
-    db_config = {"host": "200.200.200.23", "user": "root", "password": "Pak@123", "database": "asm_sys"}
+    A table's batches are followed by _END; an error is queued in place of the
+    batch that failed, for the writer to raise.
+    """
+    progress = _ReaderProgress(progress, stop)
+    table = tables[0]
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        local_cursor = local_db.cursor()
-
-        local_cursor.execute("BEGIN TRANSACTION")
-        cursor.execute("SELECT id, model, serial_number, company, location, purchase_date, status FROM assets")
-        mysql_assets = cursor.fetchall()
-
-        for asset in mysql_assets:
-            mysql_id, model, serial_number, company, location, purchase_date, status = asset
-            local_cursor.execute("SELECT id FROM assets WHERE serial_number = ?", (serial_number,))
-            existing_asset = local_cursor.fetchone()
-            if existing_asset:
-                local_id = existing_asset[0]
-                local_cursor.execute("""
-                    UPDATE assets SET model = ?, company = ?, location = ?, purchase_date = ?, status = ?, last_sync = ?
-                    WHERE id = ?
-                """, (model, company, location, purchase_date, status, time.strftime("%Y-%m-%d %H:%M:%S"), local_id))
-            else:
-                local_cursor.execute("""
-                    INSERT INTO assets (id, model, serial_number, company, location, purchase_date, status, last_sync)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (mysql_id, model, serial_number, company, location, purchase_date, status, time.strftime("%Y-%m-%d %H:%M:%S")))
-
-            cursor.execute("SELECT id, asset_id, image_name, image_data FROM asset_images WHERE asset_id = %s", (mysql_id,))
-            mysql_images = cursor.fetchall()
-            local_cursor.execute("SELECT id, image_name FROM asset_images WHERE asset_id = (SELECT id FROM assets WHERE serial_number = ?)", (serial_number,))
-            existing_images = {row[1]: row[0] for row in local_cursor.fetchall()}
-            for img in mysql_images:
-                img_id, asset_id, image_name, image_data = img
-                if image_name in existing_images:
-                    local_cursor.execute("""
-                        UPDATE asset_images SET image_data = ?, last_sync = ? WHERE id = ?
-                    """, (image_data, time.strftime("%Y-%m-%d %H:%M:%S"), existing_images[image_name]))
+        conn = connections.acquire()
+        cursor = CountingCursor(conn.cursor(), progress.trace, "server statements")
+        try:
+            for table in tables:
+                if table in ATTACHMENT_TABLES:
+                    batches = _attachment_batches(cursor, table, starts[table], max_bytes, downloads, progress)
                 else:
-                    local_cursor.execute("""
-                        INSERT INTO asset_images (id, asset_id, image_name, image_data, last_sync)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (img_id, local_id if existing_asset else mysql_id, image_name, image_data, time.strftime("%Y-%m-%d %H:%M:%S")))
-
-            cursor.execute("SELECT id, asset_id, bill_name, bill_data FROM asset_bills WHERE asset_id = %s", (mysql_id,))
-            mysql_bills = cursor.fetchall()
-            local_cursor.execute("SELECT id, bill_name FROM asset_bills WHERE asset_id = (SELECT id FROM assets WHERE serial_number = ?)", (serial_number,))
-            existing_bills = {row[1]: row[0] for row in local_cursor.fetchall()}
-            for bill in mysql_bills:
-                bill_id, asset_id, bill_name, bill_data = bill
-                if bill_name in existing_bills:
-                    local_cursor.execute("""
-                        UPDATE asset_bills SET bill_data = ?, last_sync = ? WHERE id = ?
-                    """, (bill_data, time.strftime("%Y-%m-%d %H:%M:%S"), existing_bills[bill_name]))
+                    batches = _changed_batches(cursor, table, ASSET_PULL_COLUMNS, starts[table], progress)
+                while True:
+                    # Time spent blocked on a full queue is left out: that is the writer's time
+                    with progress.trace.phase(f"read {table}"):
+                        batch = next(batches, None)
+                    if batch is None:
+                        break
+                    if not _hand_over(queues[table], (table, batch), stop):
+                        return
+                if not _hand_over(queues[table], (table, _END), stop):
+                    return
+        finally:
+            cursor.close()
+            connections.release(conn)
+    except Exception as e:
+        _hand_over(queues[table], (table, e), stop)
+
+def _write_batches(local_db, local_cursor, items, tables, watermarks, synced_at, progress):
+    """Writer stage: apply queued batches until every table in tables has ended.
+
+    Each batch is committed together with the watermark that covers it, so a failure or cancel
+    only loses the batch in progress and the next pull continues after the last committed one.
+    watermarks are the stored ones the pull started from.
+    """
+    pending = set(tables)
+    # Tables whose watermark stays before a row that could not be applied yet, for the next pull to retry
+    held = set()
+    while pending:
+        progress.check_cancelled()
+        try:
+            with progress.trace.phase("wait for server"):
+                table, batch = items.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if batch is _END:
+            pending.discard(table)
+            continue
+        if isinstance(batch, Exception):
+            raise batch
+        try:
+            with progress.trace.phase(f"write {table}"):
+                if table in ATTACHMENT_TABLES:
+                    rows = batch[0]
+                    waiting = _write_attachments(local_cursor, table, *batch, watermarks[table], synced_at, progress)
+                    if table in held:
+                        rows = []
+                    elif waiting is not None:
+                        rows = rows[:waiting]
+                        held.add(table)
                 else:
-                    local_cursor.execute("""
-                        INSERT INTO asset_bills (id, asset_id, bill_name, bill_data, last_sync)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (bill_id, local_id if existing_asset else mysql_id, bill_name, bill_data, time.strftime("%Y-%m-%d %H:%M:%S")))
+                    rows = batch
+                    _write_assets(local_cursor, rows, watermarks[table], synced_at, progress)
+                _save_watermark(local_cursor, table, rows)
+                local_db.commit()
+        except BaseException:
+            local_db.rollback()
+            raise
+
+def sync_from_server(local_db, page, full=False, progress=None):
+    # mysql.connector takes a noticeable share of a cold start, so it is loaded by the first sync instead
+    from mysql.connector import Error
+    connections = get_connection_manager()
+    progress = progress or SyncProgress()
+    result = SyncResult(True, "Sync from server completed!", progress)
+    stop = threading.Event()
+    readers = []
+    trace = progress.trace
+    try:
+        with trace.phase("connect"):
+            conn = connections.acquire()
+            try:
+                cursor = CountingCursor(conn.cursor(), trace, "server statements")
+                check_server_schema(cursor)
+                max_bytes = _packet_budget(cursor)
+                cursor.close()
+            finally:
+                connections.release(conn)
+        local_cursor = CountingCursor(local_db.cursor(), trace, "local statements")
+
+        # Only rows changed since the stored watermarks, less the overlap, are read (everything when full=True)
+        watermarks = {table: None if full else _load_watermark(local_cursor, table) for table in SYNC_TABLES}
+        starts = {table: _overlap_start(watermark) for table, watermark in watermarks.items()}
+        synced_at = time.strftime("%Y-%m-%d %H:%M:%S")
 
-        local_db.commit()
+        # Readers fetch from the server on up to pool_size connections while this thread writes
+        # what they queue to SQLite. Attachment rows are matched to assets by serial number, so
+        # every asset batch is written before the first attachment batch.
+        asset_queue = queue.Queue(PIPELINE_DEPTH)
+        attachment_queue = queue.Queue(PIPELINE_DEPTH)
+        queues = {table: attachment_queue if table in ATTACHMENT_TABLES else asset_queue for table in SYNC_TABLES}
+        lanes = max(1, min(connections.pool_size, len(SYNC_TABLES)))
+        downloads = _Downloads()
+        for lane in range(lanes):
+            reader = threading.Thread(
+                target=_read_tables,
+                args=(connections, SYNC_TABLES[lane::lanes], starts, max_bytes, queues, downloads, stop, progress),
+                name=f"sync-read-{lane}",
+                daemon=True,
+            )
+            reader.start()
+            readers.append(reader)
+        _write_batches(local_db, local_cursor, asset_queue, ("assets",), watermarks, synced_at, progress)
+        _write_batches(local_db, local_cursor, attachment_queue, tuple(ATTACHMENT_TABLES), watermarks, synced_at, progress)
         if page:
-            page.snack_bar = ft.SnackBar(content=ft.Text("Sync from server completed!"), duration=4000)
+            page.snack_bar = ft.SnackBar(content=ft.Text(result.message), duration=4000)
             page.snack_bar.open = True
             page.update()
-    except Error as e:
+    except SyncCancelled:
+        result = SyncResult(False, "Sync from server cancelled; the batches already pulled were kept.", progress)
+    except (Error, sqlite3.Error) as e:
         local_db.rollback()
+        result = SyncResult(False, f"Sync error: {e}", progress)
         if page:
-            page.snack_bar = ft.SnackBar(content=ft.Text(f"Sync error: {e}"), duration=4000)
+            page.snack_bar = ft.SnackBar(content=ft.Text(result.message), duration=4000)
             page.snack_bar.open = True
     finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+        # Readers notice within a batch or a chunk and hand their connections back
+        stop.set()
+        for reader in readers:
+            reader.join()
         if 'local_cursor' in locals():
             local_cursor.close()
+        trace.stop()
+    return result
 
-def sync_to_server(local_db, page):
-    db_config = {"host": "200.200.200.23", "user": "root", "password": "Pak@123", "database": "asm_sys"}
-    try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        local_cursor = local_db.cursor()
-
-        cursor.execute("BEGIN")
-        local_cursor.execute("SELECT id, model, serial_number, company, location, purchase_date, status, last_sync FROM assets")
-        local_assets = local_cursor.fetchall()
-
-        for asset in local_assets:
-            local_id, model, serial_number, company, location, purchase_date, status, last_sync = asset
-            cursor.execute("SELECT id FROM assets WHERE serial_number = %s", (serial_number,))
-            existing_asset = cursor.fetchone()
-            if existing_asset:
-                mysql_id = existing_asset[0]
-                cursor.execute("""
-                    UPDATE assets SET model = %s, company = %s, location = %s, purchase_date = %s, status = %s
-                    WHERE id = %s
-                """, (model, company, location, purchase_date, status, mysql_id))
+# Multi-row statements are kept to this share of the server's max_allowed_packet,
+# leaving room for the SQL text and the connector's escaping of binary values.
+PACKET_BUDGET_RATIO = 0.75
+MAX_BATCH_ROWS = 500
+
+def _row_size(row):
+    return sum(len(value) if isinstance(value, (bytes, bytearray, str)) else 8 for value in row) + 4 * len(row)
+
+def _batches(rows, max_bytes, max_rows=MAX_BATCH_ROWS):
+    batch = []
+    batch_size = 0
+    for row in rows:
+        row_size = _row_size(row)
+        if batch and (batch_size + row_size > max_bytes or len(batch) >= max_rows):
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append(row)
+        batch_size += row_size
+    if batch:
+        yield batch
+
+def _upsert_batch(cursor, table, columns, batch, progress, keys=("id",)):
+    """Insert a batch in one statement; on a duplicate key the columns other than keys are updated."""
+    progress.check_cancelled()
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    updates = ", ".join(f"{column} = VALUES({column})" for column in columns if column not in keys)
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(batch))} "
+        f"ON DUPLICATE KEY UPDATE {updates}",
+        [value for row in batch for value in row],
+    )
+    progress.add(table, rows=len(batch), nbytes=sum(_row_size(row) for row in batch))
+
+def _insert_batch(cursor, table, columns, batch, progress):
+    progress.check_cancelled()
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(batch))}",
+        [value for row in batch for value in row],
+    )
+    progress.add(table, rows=len(batch), nbytes=sum(_row_size(row) for row in batch))
+
+def _max_allowed_packet(cursor):
+    cursor.execute("SELECT @@max_allowed_packet")
+    return int(cursor.fetchone()[0])
+
+def _packet_budget(cursor):
+    """Bytes of row data per statement or fetch: a share of the server's packet limit, capped by memory_limit_mb."""
+    packet_budget = int(_max_allowed_packet(cursor) * PACKET_BUDGET_RATIO)
+    memory_limit = int(float(load_sync_config()["memory_limit_mb"]) * 1024 * 1024)
+    return min(packet_budget, memory_limit)
+
+OUTBOX_BATCH = 200
+
+def _select_by_ids(local_cursor, sql, ids):
+    for chunk in _chunks(ids):
+        local_cursor.execute(sql.format(_placeholders(chunk)), chunk)
+        yield from local_cursor.fetchall()
+
+def _serial_key(serial_number):
+    """A serial number as the server's default collation compares it: case-insensitive, trailing spaces ignored."""
+    return serial_number.rstrip(" ").casefold()
+
+def _push_assets(cursor, local_cursor, asset_ids, max_bytes, progress):
+    """Upsert assets by serial number; returns ({local id: server id}, {local id: label} of unresolved assets).
+
+    Ids are assigned by each database on its own, so new assets are inserted without one and
+    the ids the server gave them are read back by serial number. Assets without a serial number,
+    or whose serial the server matched to one spelled too differently to recognise, are not resolved.
+    """
+    local_assets = _select_by_ids(
+        local_cursor,
+        "SELECT id, model, serial_number, company, location, purchase_date, status FROM assets WHERE id IN ({})",
+        asset_ids,
+    )
+    server_ids = {}
+    unresolved = {}
+    for batch in _batches(local_assets, max_bytes):
+        for row in batch:
+            if not (row[2] or "").strip():
+                # An upsert keyed on an empty serial number would add a server asset on every push
+                unresolved[row[0]] = f"asset {row[0]} without a serial number"
+        batch = [row for row in batch if row[0] not in unresolved]
+        if not batch:
+            continue
+        _upsert_batch(
+            cursor, "assets", ("model", "serial_number", "company", "location", "purchase_date", "status"),
+            [row[1:] for row in batch], progress, keys=("serial_number",),
+        )
+        serials = [row[2] for row in batch]
+        cursor.execute(f"SELECT serial_number, id FROM assets WHERE serial_number IN ({_placeholders(serials, '%s')})", serials)
+        # The server returns its own spelling of each serial number
+        assigned = {_serial_key(serial_number): mysql_id for serial_number, mysql_id in cursor.fetchall()}
+        for row in batch:
+            mysql_id = assigned.get(_serial_key(row[2]))
+            if mysql_id is None:
+                unresolved[row[0]] = row[2]
             else:
-                cursor.execute("""
-                    INSERT INTO assets (id, model, serial_number, company, location, purchase_date, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (local_id, model, serial_number, company, location, purchase_date, status))
-                mysql_id = local_id
-
-            local_cursor.execute("SELECT id, asset_id, image_name, image_data, last_sync FROM asset_images WHERE asset_id = ?", (local_id,))
-            images = local_cursor.fetchall()
-            cursor.execute("SELECT id, image_name FROM asset_images WHERE asset_id = %s", (mysql_id,))
-            existing_images = {row[0]: row[1] for row in cursor.fetchall()}
-            for img in images:
-                img_id, asset_id, image_name, image_data, last_sync = img
-                if img_id in existing_images:
-                    cursor.execute("""
-                        UPDATE asset_images SET image_name = %s, image_data = %s WHERE id = %s AND asset_id = %s
-                    """, (image_name, image_data, img_id, mysql_id))
-                else:
-                    cursor.execute("""
-                        INSERT INTO asset_images (id, asset_id, image_name, image_data)
-                        VALUES (%s, %s, %s, %s)
-                    """, (img_id, mysql_id, image_name, image_data))
-
-            local_cursor.execute("SELECT id, asset_id, bill_name, bill_data, last_sync FROM asset_bills WHERE asset_id = ?", (local_id,))
-            bills = local_cursor.fetchall()
-            cursor.execute("SELECT id, bill_name FROM asset_bills WHERE asset_id = %s", (mysql_id,))
-            existing_bills = {row[0]: row[1] for row in cursor.fetchall()}
-            for bill in bills:
-                bill_id, asset_id, bill_name, bill_data, last_sync = bill
-                if bill_id in existing_bills:
-                    cursor.execute("""
-                        UPDATE asset_bills SET bill_name = %s, bill_data = %s WHERE id = %s AND asset_id = %s
-                    """, (bill_name, bill_data, bill_id, mysql_id))
+                server_ids[row[0]] = mysql_id
+    return server_ids, unresolved
+
+def _push_attachments(cursor, local_cursor, table, row_ids, server_ids, max_bytes, progress):
+    """Write local attachment rows to the server; returns the (local id, server row id) links to record locally."""
+    name_column, data_column, digest_column = ATTACHMENT_TABLES[table]
+    local_rows = [
+        (local_id, server_ids[asset_id], name, digest, server_id)
+        for local_id, asset_id, name, digest, server_id in _select_by_ids(
+            local_cursor,
+            f"SELECT id, asset_id, {name_column}, {digest_column}, server_id FROM {table} WHERE id IN ({{}})",
+            row_ids,
+        )
+        if asset_id in server_ids
+    ]
+    if not local_rows:
+        return []
+
+    server_rows = {}
+    server_names = {}
+    for chunk in _chunks({row[1] for row in local_rows}):
+        cursor.execute(
+            f"SELECT id, asset_id, {name_column}, {digest_column} FROM {table} "
+            f"WHERE asset_id IN ({_placeholders(chunk, '%s')})",
+            chunk,
+        )
+        for row_id, asset_id, name, digest in cursor.fetchall():
+            server_rows[row_id] = (asset_id, name, digest)
+            server_names[(asset_id, name)] = row_id
+
+    # A local row linked to a server row of its asset updates that row, which carries a rename
+    # (the editor replaces an attachment by renaming it); other rows are matched by
+    # (server asset id, name), and local row ids mean nothing on the server. Changed rows are
+    # (server row id or None for a new row, server asset id, name, digest).
+    links = []
+    new_rows = {}
+    new_names = []
+    renames = []
+    changed = []
+    for local_id, asset_id, name, digest, server_id in local_rows:
+        if server_id in server_rows and server_rows[server_id][0] == asset_id:
+            row_id = server_id
+        else:
+            row_id = server_names.get((asset_id, name))
+        if row_id is None:
+            if (asset_id, name) not in new_rows:
+                if digest is None:
+                    new_names.append((asset_id, name))
                 else:
-                    cursor.execute("""
-                        INSERT INTO asset_bills (id, asset_id, bill_name, bill_data)
-                        VALUES (%s, %s, %s, %s)
-                    """, (bill_id, mysql_id, bill_name, bill_data))
+                    changed.append((None, asset_id, name, digest))
+            new_rows.setdefault((asset_id, name), []).append(local_id)
+            continue
+        links.append((local_id, row_id))
+        _, server_name, server_digest = server_rows[row_id]
+        if digest is not None and server_digest != digest:
+            changed.append((row_id, asset_id, name, digest))
+        elif server_name != name:
+            renames.append((name, row_id, asset_id))
+
+    # Content already stored under another server row (in either attachment table) is copied
+    # there instead of being re-sent; large content was uploaded in chunks beforehand
+    on_server = _server_sources(cursor, {row[3] for row in changed})
+    store = get_blob_store()
+    chunk_size = _chunk_size(max_bytes)
+    send = []
+    assemble = []
+    copy = []
+    for row in changed:
+        if row[3] in on_server:
+            copy.append(row)
+        else:
+            (assemble if store.size(row[3]) > chunk_size else send).append(row)
+            on_server[row[3]] = table
+
+    for batch in _batches(new_names, max_bytes):
+        _insert_batch(cursor, table, ("asset_id", name_column), batch, progress)
+    rows = ((*row[1:], load_attachment(row[3])) for row in send if row[0] is None)
+    for batch in _batches(rows, max_bytes):
+        _insert_batch(cursor, table, ("asset_id", name_column, digest_column, data_column), batch, progress)
+    for row_id, asset_id, name, digest in send:
+        if row_id is None:
+            continue
+        progress.check_cancelled()
+        data = load_attachment(digest)
+        cursor.execute(
+            f"UPDATE {table} SET {name_column} = %s, {digest_column} = %s, {data_column} = %s WHERE id = %s AND asset_id = %s",
+            (name, digest, data, row_id, asset_id),
+        )
+        progress.add(table, rows=1, nbytes=len(data))
+    for name, row_id, asset_id in renames:
+        progress.check_cancelled()
+        cursor.execute(f"UPDATE {table} SET {name_column} = %s WHERE id = %s AND asset_id = %s", (name, row_id, asset_id))
+        progress.add(table, rows=1)
+    for row in assemble:
+        _assemble_from_chunks(cursor, table, row, progress)
+    for row_id, asset_id, name, digest in copy:
+        source_table = on_server[digest]
+        _, source_data_column, source_digest_column = ATTACHMENT_TABLES[source_table]
+        if row_id is None:
+            cursor.execute(f"""
+                INSERT INTO {table} (asset_id, {name_column}, {digest_column}, {data_column})
+                SELECT %s, %s, {source_digest_column}, {source_data_column} FROM {source_table}
+                WHERE {source_digest_column} = %s LIMIT 1
+            """, (asset_id, name, digest))
+        else:
+            # The inner derived table lets MySQL read the table being updated
+            cursor.execute(f"""
+                UPDATE {table} SET {name_column} = %s, {digest_column} = %s, {data_column} = (
+                    SELECT data FROM (
+                        SELECT {source_data_column} AS data FROM {source_table} WHERE {source_digest_column} = %s LIMIT 1
+                    ) AS source_row
+                ) WHERE id = %s AND asset_id = %s
+            """, (name, digest, digest, row_id, asset_id))
+        progress.add(table, rows=1)
+
+    # Read back the ids the server gave the new rows; the newest row of a name is the one just inserted
+    for chunk in _chunks({asset_id for asset_id, _ in new_rows}):
+        cursor.execute(
+            f"SELECT asset_id, {name_column}, MAX(id) FROM {table} WHERE asset_id IN ({_placeholders(chunk, '%s')}) "
+            f"GROUP BY asset_id, {name_column}",
+            chunk,
+        )
+        for asset_id, name, row_id in cursor.fetchall():
+            links.extend((local_id, row_id) for local_id in new_rows.get((asset_id, name), ()))
+    return links
+
+def _server_sources(cursor, digests):
+    """Map each digest already held by a server attachment table to one such table."""
+    on_server = {}
+    for source_table, (_, _, source_digest_column) in ATTACHMENT_TABLES.items():
+        for chunk in _chunks(set(digests) - on_server.keys()):
+            cursor.execute(
+                f"SELECT DISTINCT {source_digest_column} FROM {source_table} "
+                f"WHERE {source_digest_column} IN ({_placeholders(chunk, '%s')})",
+                chunk,
+            )
+            on_server.update((row[0], source_table) for row in cursor.fetchall())
+    return on_server
+
+def _oversized_entries(cursor, local_cursor, entries, max_packet):
+    """{outbox seq: file name} of queued attachments too large for the server to hold.
+
+    Chunks are assembled with CONCAT, which MySQL turns into NULL once the result exceeds
+    max_allowed_packet. Content the server already holds is copied there and is not affected.
+    """
+    store = get_blob_store()
+    candidates = {}
+    for table, (name_column, _, digest_column) in ATTACHMENT_TABLES.items():
+        seqs = {row_id: seq for seq, entry_table, row_id in entries if entry_table == table}
+        for row_id, name, digest in _select_by_ids(
+            local_cursor, f"SELECT id, {name_column}, {digest_column} FROM {table} WHERE id IN ({{}})", seqs,
+        ):
+            if digest and store.exists(digest) and store.size(digest) > max_packet:
+                candidates[seqs[row_id]] = (name, digest)
+    on_server = _server_sources(cursor, {digest for _, digest in candidates.values()})
+    return {seq: name for seq, (name, digest) in candidates.items() if digest not in on_server}
+
+def _stage_large_attachments(conn, cursor, local_cursor, entries, max_bytes, progress):
+    """Upload queued content too large for one statement into attachment_chunks; returns the staged digests.
+
+    Runs before the batch transaction and commits every chunk, so a retry after a dropped
+    connection only sends the chunks the server has not acknowledged yet.
+    """
+    store = get_blob_store()
+    chunk_size = _chunk_size(max_bytes)
+    digests = {}
+    for table, (_, _, digest_column) in ATTACHMENT_TABLES.items():
+        row_ids = [row_id for _, entry_table, row_id in entries if entry_table == table]
+        for (digest,) in _select_by_ids(local_cursor, f"SELECT {digest_column} FROM {table} WHERE id IN ({{}})", row_ids):
+            if digest and store.exists(digest) and store.size(digest) > chunk_size:
+                digests[digest] = table
+    for digest in _server_sources(cursor, digests):
+        del digests[digest]
+
+    for digest, table in digests.items():
+        # Resume after the last contiguous chunk the server holds
+        cursor.execute("SELECT chunk_offset, LENGTH(data) FROM attachment_chunks WHERE sha256 = %s ORDER BY chunk_offset", (digest,))
+        offset = 0
+        for chunk_offset, length in cursor.fetchall():
+            if chunk_offset != offset:
+                break
+            offset += length
+        cursor.execute("DELETE FROM attachment_chunks WHERE sha256 = %s AND chunk_offset >= %s", (digest, offset))
+        conn.commit()
+        size = store.size(digest)
+        content = store.open(digest)
+        try:
+            while offset < size:
+                progress.check_cancelled()
+                data = content[offset:offset + chunk_size]
+                cursor.execute(
+                    "INSERT INTO attachment_chunks (sha256, chunk_offset, data) VALUES (%s, %s, %s)", (digest, offset, data)
+                )
+                conn.commit()
+                offset += len(data)
+                progress.add(table, nbytes=len(data))
+        finally:
+            content.close()
+    return digests
+
+def _assemble_from_chunks(cursor, table, row, progress):
+    """Write a staged attachment into its server row by appending its chunks on the server."""
+    from mysql.connector import Error
+    row_id, asset_id, name, digest = row
+    name_column, data_column, digest_column = ATTACHMENT_TABLES[table]
+    if row_id is None:
+        cursor.execute(
+            f"INSERT INTO {table} (asset_id, {name_column}, {digest_column}, {data_column}) VALUES (%s, %s, %s, '')",
+            (asset_id, name, digest),
+        )
+        row_id = cursor.lastrowid
+    else:
+        cursor.execute(
+            f"UPDATE {table} SET {name_column} = %s, {digest_column} = %s, {data_column} = '' WHERE id = %s AND asset_id = %s",
+            (name, digest, row_id, asset_id),
+        )
+    cursor.execute("SELECT chunk_offset FROM attachment_chunks WHERE sha256 = %s ORDER BY chunk_offset", (digest,))
+    for (offset,) in cursor.fetchall():
+        progress.check_cancelled()
+        cursor.execute(f"""
+            UPDATE {table} SET {data_column} = CONCAT({data_column},
+                (SELECT data FROM attachment_chunks WHERE sha256 = %s AND chunk_offset = %s))
+            WHERE id = %s
+        """, (digest, offset, row_id))
+    cursor.execute(f"SELECT LENGTH({data_column}) FROM {table} WHERE id = %s", (row_id,))
+    if cursor.fetchone()[0] != get_blob_store().size(digest):
+        raise Error(msg=f"Uploaded chunks of {name} are incomplete")
+    progress.add(table, rows=1)
+
+def _push_outbox_batch(cursor, local_cursor, entries, max_bytes, progress):
+    dirty = {table: [] for table in SYNC_TABLES}
+    for _, table, row_id in entries:
+        dirty[table].append(row_id)
+
+    # Attachments need their asset on the server; re-sending an unchanged asset is a no-op upsert
+    asset_ids = set(dirty["assets"])
+    owners = {"assets": {row_id: row_id for row_id in dirty["assets"]}}
+    for table in ATTACHMENT_TABLES:
+        owners[table] = dict(
+            _select_by_ids(local_cursor, f"SELECT id, asset_id FROM {table} WHERE id IN ({{}})", dirty[table])
+        )
+        asset_ids.update(owners[table].values())
+
+    with progress.trace.phase("push assets"):
+        server_ids, unresolved = _push_assets(cursor, local_cursor, asset_ids, max_bytes, progress)
+    links = {}
+    for table in ATTACHMENT_TABLES:
+        with progress.trace.phase(f"push {table}"):
+            links[table] = _push_attachments(cursor, local_cursor, table, dirty[table], server_ids, max_bytes, progress)
+    # Entries of unresolved assets and their attachments stay queued
+    held = {seq for seq, table, row_id in entries if owners[table].get(row_id) in unresolved}
+    return links, held, set(unresolved.values())
+
+def sync_to_server(local_db, page, full=False, progress=None):
+    from mysql.connector import Error
+    connections = get_connection_manager()
+    progress = progress or SyncProgress()
+    result = SyncResult(True, "Sync to server completed!", progress)
+    trace = progress.trace
+    try:
+        with trace.phase("connect"):
+            conn = connections.acquire()
+        cursor = CountingCursor(conn.cursor(), trace, "server statements")
+        local_cursor = CountingCursor(local_db.cursor(), trace, "local statements")
+
+        if full:
+            queue_all_for_upload(local_cursor)
+            local_db.commit()
 
+        # Rows go up as multi-row INSERT ... ON DUPLICATE KEY UPDATE batches sized to the server packet limit
+        check_server_schema(cursor)
+        max_bytes = _packet_budget(cursor)
+        max_packet = _max_allowed_packet(cursor)
+        cursor.execute(
+            "DELETE FROM attachment_chunks WHERE uploaded_at < NOW() - INTERVAL %s DAY", (CHUNK_RETENTION_DAYS,)
+        )
         conn.commit()
+        last_seq = 0
+        rejected = set()
+        unmatched = set()
+        while True:
+            local_cursor.execute(
+                "SELECT seq, table_name, row_id FROM sync_outbox WHERE seq > ? ORDER BY seq LIMIT ?", (last_seq, OUTBOX_BATCH)
+            )
+            entries = local_cursor.fetchall()
+            if not entries:
+                break
+            last_seq = entries[-1][0]
+            # Such content stays queued (until max_allowed_packet is raised) and the entries after it go ahead
+            oversized = _oversized_entries(cursor, local_cursor, entries, max_packet)
+            rejected.update(oversized.values())
+            entries = [entry for entry in entries if entry[0] not in oversized]
+            if not entries:
+                continue
+            with trace.phase("stage chunks"):
+                staged = _stage_large_attachments(conn, cursor, local_cursor, entries, max_bytes, progress)
+            cursor.execute("BEGIN")
+            links, held, unresolved = _push_outbox_batch(cursor, local_cursor, entries, max_bytes, progress)
+            unmatched.update(unresolved)
+            with trace.phase("server commit"):
+                conn.commit()
+            if staged:
+                cursor.execute(
+                    f"DELETE FROM attachment_chunks WHERE sha256 IN ({_placeholders(staged, '%s')})", list(staged)
+                )
+                conn.commit()
+            # Linked rows follow their server row when renamed later
+            for table, table_links in links.items():
+                local_cursor.executemany(
+                    f"UPDATE {table} SET server_id = ? WHERE id = ?", [(row_id, local_id) for local_id, row_id in table_links]
+                )
+            # Entries re-queued by an edit made during the upload have a new seq and stay in the outbox
+            seqs = [entry[0] for entry in entries if entry[0] not in held]
+            local_cursor.execute(f"DELETE FROM sync_outbox WHERE seq IN ({_placeholders(seqs)})", seqs)
+            local_db.commit()
+
+        problems = []
+        if rejected:
+            problems.append(
+                f"{len(rejected)} attachment(s) are larger than the server's max_allowed_packet of "
+                f"{max_packet / 1024 / 1024:.0f} MB: {', '.join(sorted(rejected))}"
+            )
+        if unmatched:
+            problems.append(
+                f"{len(unmatched)} asset(s) could not be matched to a server asset by serial number: {', '.join(sorted(unmatched))}"
+            )
+        if problems:
+            result = SyncResult(False, "Sync to server finished, but these stay queued: " + "; ".join(problems), progress)
         if page:
-            page.snack_bar = ft.SnackBar(content=ft.Text("Sync to server completed!"), duration=4000)
+            page.snack_bar = ft.SnackBar(content=ft.Text(result.message), duration=4000)
             page.snack_bar.open = True
             page.update()
-    except Error as e:
+    except SyncCancelled:
         conn.rollback()
+        local_db.rollback()
+        # Batches committed before the cancel are already on the server and out of the outbox
+        result = SyncResult(False, "Sync to server cancelled; the remaining edits stay queued.", progress)
+    except (Error, sqlite3.Error) as e:
+        if 'conn' in locals():
+            conn.rollback()
+        local_db.rollback()
+        result = SyncResult(False, f"Sync error: {e}", progress)
         if page:
-            page.snack_bar = ft.SnackBar(content=ft.Text(f"Sync error: {e}"), duration=4000)
+            page.snack_bar = ft.SnackBar(content=ft.Text(result.message), duration=4000)
             page.snack_bar.open = True
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
+            connections.release(conn)
         if 'local_cursor' in locals():
             local_cursor.close()
+        trace.stop()
+    return result
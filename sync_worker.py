@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+import flet as ft
+from perf import export_trace, ui_trace
+from repository import connect
+from sync_connection import load_sync_config
+from sync_server import LOCAL_DB_PATH, SyncProgress, SyncResult, sync_from_server, sync_to_server
+from ui_updates import get_update_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress repaints of the sync dialog
+PROGRESS_INTERVAL = 0.25
+
+_worker = None
+
+class SyncWorker:
+    """Runs at most one sync at a time on a background thread with its own SQLite connection."""
+
+    def __init__(self, db_path=LOCAL_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, direction, on_progress=None, on_done=None):
+        """Start a "pull" or "push" sync; returns False if another sync is still running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._cancel_event.clear()
+            progress = SyncProgress(on_progress, self._cancel_event, name=f"sync {direction}")
+            self._thread = threading.Thread(
+                target=self._run, args=(direction, progress, on_done), name=f"sync-{direction}", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def _run(self, direction, progress, on_done):
+        sync = sync_from_server if direction == "pull" else sync_to_server
+        page_updates = ui_trace.counters.get("page updates", 0)
+        try:
+            local_db = connect(self.db_path, timeout=30)
+            try:
+                result = sync(local_db, None, progress=progress)
+            finally:
+                local_db.close()
+        except Exception as e:
+            # Errors the sync does not handle itself (e.g. blob store I/O) must still finish the dialog
+            logger.exception("%s failed", progress.trace.name)
+            progress.trace.stop()
+            result = SyncResult(False, f"Sync error: {e}", progress)
+        if on_done:
+            on_done(result)
+        progress.trace.count("page updates", ui_trace.counters.get("page updates", 0) - page_updates)
+        logger.info("%s: %s %s", progress.trace.name, result.message, progress.trace.summary())
+        trace_dir = load_sync_config()["trace_dir"]
+        if trace_dir:
+            data = {**progress.to_dict(), "ok": result.ok, "message": result.message}
+            try:
+                logger.info("Sync trace written to %s", export_trace(data, trace_dir, f"sync-{direction}"))
+            except OSError as e:
+                logger.warning("Could not write sync trace: %s", e)
+
+def get_sync_worker():
+    global _worker
+    if _worker is None:
+        _worker = SyncWorker()
+    return _worker
+
+def run_sync_dialog(page, dialog, direction, on_close, on_finished=None):
+    """Run a sync in the background and stream its progress into dialog until it finishes or is cancelled."""
+    worker = get_sync_worker()
+    updates = get_update_scheduler(page)
+    status = ft.Text("Connecting to server...")
+    ok_button = ft.TextButton("OK", on_click=on_close)
+    cancel_button = ft.TextButton("Cancel", on_click=lambda e: cancel())
+    last_repaint = [0.0]
+
+    def cancel():
+        with updates.batch():
+            worker.cancel()
+            status.value = "Cancelling..."
+            cancel_button.disabled = True
+            updates.request()
+
+    def on_progress(progress):
+        now = time.monotonic()
+        if now - last_repaint[0] < PROGRESS_INTERVAL:
+            return
+        last_repaint[0] = now
+        status.value = progress.summary()
+        updates.request(status)
+
+    def on_done(result):
+        # The final status and whatever on_finished refreshes go out as one update
+        with updates.batch():
+            status.value = f"{result.message}\n{result.progress.summary()}\n{result.progress.trace.summary()}"
+            dialog.actions = [ok_button]
+            if on_finished:
+                on_finished(result)
+            updates.request()
+
+    if worker.running and dialog.open:
+        # The dialog is already showing the running sync's progress
+        return
+    dialog.content = status
+    dialog.actions = [cancel_button]
+    dialog.open = True
+    if not worker.start(direction, on_progress, on_done):
+        status.value = "A sync is already running. Please wait for it to finish."
+        dialog.actions = [ok_button]
+    updates.request()
@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from blobstore import get_blob_store
+from repository import get_repository
+from ui_updates import get_update_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Bounding box of stored thumbnails: 2x the 50x50 previews for high-density screens
+THUMBNAIL_SIZE = (128, 128)
+THUMBNAIL_QUALITY = 80
+CACHE_ENTRIES = 256
+WORKERS = 2
+
+_service = None
+_service_lock = threading.Lock()
+
+def make_thumbnail(data):
+    """JPEG thumbnail bytes of an image, or None if Pillow is missing or data is not a readable image."""
+    try:
+        # Loaded by the first preview on the worker pool instead of at app start
+        from PIL import Image, ImageOps
+    except ImportError:
+        # Without Pillow previews fall back to showing the original image
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Lets the JPEG decoder scale down while decoding instead of inflating the full photo
+            image.draft("RGB", THUMBNAIL_SIZE)
+            thumbnail = ImageOps.exif_transpose(image)
+            thumbnail.thumbnail(THUMBNAIL_SIZE)
+            if thumbnail.mode != "RGB":
+                thumbnail = thumbnail.convert("RGB")
+            out = io.BytesIO()
+            thumbnail.save(out, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+            return out.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+class LRUCache:
+    """Thread-safe mapping that keeps only the most recently used max_entries items."""
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+class ThumbnailService:
+    """Builds thumbnails on a small worker pool, stores them by source digest and caches them base64-encoded."""
+
+    def __init__(self, repository=None, workers=WORKERS, cache_entries=CACHE_ENTRIES):
+        self.repository = repository or get_repository()
+        self.cache = LRUCache(cache_entries)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+    def request(self, callback, data=None, digest=None):
+        """Call callback(digest, base64 thumbnail or None) for image bytes or a stored attachment digest.
+
+        Cache hits are answered immediately; everything else runs on the worker pool.
+        """
+        if digest is not None:
+            cached = self.cache.get(digest)
+            if cached is not None:
+                callback(digest, cached)
+                return None
+        return self._executor.submit(self._load, callback, data, digest)
+
+    def _load(self, callback, data, digest):
+        try:
+            digest = digest or hashlib.sha256(data).hexdigest()
+            thumbnail = self.cache.get(digest)
+            if thumbnail is None:
+                stored = self.repository.get_thumbnail(digest)
+                if stored is None:
+                    if data is None:
+                        data = get_blob_store().read(digest)
+                    stored = make_thumbnail(data) if data else None
+                    if stored is not None:
+                        self.repository.save_thumbnail(digest, stored)
+                if stored is not None:
+                    thumbnail = base64.b64encode(stored).decode("ascii")
+                    self.cache.put(digest, thumbnail)
+            callback(digest, thumbnail)
+        except Exception as e:
+            logger.warning("Error building thumbnail: %s", e)
+
+def get_thumbnail_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ThumbnailService()
+        return _service
+
+def show_thumbnail(image_control, data=None, digest=None):
+    """Fill image_control with the thumbnail of data or a stored digest once it is ready.
+
+    Only the latest request per control is shown, so a slow thumbnail never replaces a newer pick.
+    """
+    request = object()
+    image_control.data = request
+
+    def on_ready(_, thumbnail):
+        if image_control.data is not request:
+            return
+        if thumbnail is None and data is not None:
+            thumbnail = base64.b64encode(data).decode("utf-8")
+        image_control.src_base64 = thumbnail
+        # Without a page the dialog is either closed or not sent yet, and its next update carries the image
+        if image_control.page is not None:
+            get_update_scheduler(image_control.page).request(image_control)
+
+    get_thumbnail_service().request(on_ready, data=data, digest=digest)
+
+def clear_thumbnail(image_control):
+    """Empty image_control and drop any thumbnail still on its way to it."""
+    image_control.data = None
+    image_control.src_base64 = None
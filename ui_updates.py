@@ -0,0 +1,108 @@
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Longest a change requested outside an event handler waits before it is sent (about one frame)
+FRAME_INTERVAL = 1 / 30
+
+_schedulers_lock = threading.Lock()
+
+class UpdateScheduler:
+    """Coalesces the UI updates of one page so each event sends a single diff to the client.
+
+    Code that changes controls calls request() instead of page.update() or control.update().
+    Inside batch(), which wraps event handlers, everything requested is sent by one
+    page.update() when the outermost batch ends; requests from anywhere else (thumbnail and
+    sync threads) are collected and sent together at most one frame later.
+    """
+
+    def __init__(self, page, frame_interval=FRAME_INTERVAL):
+        self.page = page
+        self.frame_interval = frame_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._controls = []
+        self._whole_page = False
+        self._timer = None
+
+    def request(self, *controls):
+        """Mark controls, or the whole page when none are given, as needing an update."""
+        with self._lock:
+            if not controls:
+                self._whole_page = True
+            elif not self._whole_page:
+                for control in controls:
+                    if not any(control is pending for pending in self._controls):
+                        self._controls.append(control)
+            if getattr(self._local, "depth", 0) or self._timer is not None:
+                return
+            self._timer = threading.Timer(self.frame_interval, self._flush_frame)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @contextmanager
+    def batch(self):
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        try:
+            yield self
+        finally:
+            self._local.depth -= 1
+            if not self._local.depth:
+                self.flush()
+
+    def flush(self):
+        """Send everything requested so far in one update."""
+        with self._lock:
+            controls, whole_page = self._controls, self._whole_page
+            self._controls, self._whole_page = [], False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if whole_page:
+            self.page.update()
+        else:
+            # Controls of a dialog that was closed in the meantime are no longer on the page
+            controls = [control for control in controls if control.page is not None]
+            if controls:
+                self.page.update(*controls)
+
+    def _flush_frame(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Deferred UI update failed: %s", e)
+
+def get_update_scheduler(page):
+    with _schedulers_lock:
+        scheduler = getattr(page, "_update_scheduler", None)
+        if scheduler is None:
+            scheduler = page._update_scheduler = UpdateScheduler(page)
+        return scheduler
+
+def batch_updates(handler):
+    """Run a method of an object with an .updates scheduler as one batch, so the updates it requests go out together."""
+
+    @functools.wraps(handler)
+    def run(self, *args, **kwargs):
+        # Not self.page: Flet clears the page of a view while it is off screen
+        with self.updates.batch():
+            return handler(self, *args, **kwargs)
+
+    return run
+
+def add_overlays(page, *controls):
+    """Register dialogs and pickers on the page overlay; returns them for remove_overlays() when their owner goes."""
+    page.overlay.extend(controls)
+    return list(controls)
+
+def remove_overlays(page, controls):
+    """Take controls off the page overlay; the client hears of it with the next update."""
+    for control in controls:
+        # Compared by identity, which is what Flet uses for controls
+        for position, registered in enumerate(page.overlay):
+            if registered is control:
+                del page.overlay[position]
+                break